@@ -1,13 +1,47 @@
 import asyncio
-import json
 import os
+import random
 import time
+import warnings
 
 import aiohttp
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Growth factor applied to the poll interval while no new activity arrives.
+POLL_BACKOFF_FACTOR = 1.6
+
+# Maximum number of attempts for a Direct Line request, and the base delay in
+# seconds of the exponential backoff between attempts.
+MAX_REQUEST_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5
+
+# Maximum seconds to poll for a farewell message after closing a conversation.
+CLOSE_CONVERSATION_TIMEOUT = 2
+
+# Seconds without a new activity after a bot message at which a turn is
+# considered over, if the bot did not mark its end.
+TURN_QUIET_PERIOD = 2
+
+# Seconds before its expiry at which the conversation token is refreshed.
+TOKEN_REFRESH_MARGIN = 120
+
+
+def _is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Check whether a failed Direct Line request is worth retrying, i.e. it failed
+    with a connection error, a timeout, throttling (429) or a server error (5xx).
+    A request that is not idempotent is only retried when the server cannot have
+    processed it: on throttling, or when the connection could not be opened.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or (idempotent and error.status >= 500)
+    if not idempotent:
+        return isinstance(error, aiohttp.ClientConnectorError)
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
 
 class MCSAgent:
     """
@@ -20,38 +54,157 @@ class MCSAgent:
         user_id: str = "default_user",
         locale: str = "en-EN",
         timeout: int = 60,
-        poll_interval: int = 5,
+        poll_interval: float = None,
         save_to: str = None,
+        min_poll_interval: float = 0.3,
+        max_poll_interval: float = 8.0,
+        typing_poll_interval: float = 1.0,
     ):
         """
-        Initialize the MCSAgent with user ID, locale, timeout, and poll interval.
+        Initialize the MCSAgent with user ID, locale, timeout, and poll intervals.
         Args:
             user_id (str): Unique identifier for the user interacting with the agent.
             locale (str): Locale for the conversation, e.g., "en-EN".
             timeout (int): Maximum seconds to wait for a response from the agent.
-            poll_interval (int): Interval in seconds to poll for a response.
-            save_to (str): Optional file path to save the full response.
+            poll_interval (float): Deprecated, use max_poll_interval instead.
+            save_to (str): Optional JSONL file path to append the full response
+                of each turn to, one line per turn.
+            min_poll_interval (float): Initial interval in seconds between polls.
+                The interval grows exponentially while no new activity arrives.
+            max_poll_interval (float): Upper bound in seconds for the poll interval.
+            typing_poll_interval (float): Upper bound in seconds for the poll
+                interval while the bot is typing, as its message is imminent.
         """
+        if poll_interval is not None:
+            warnings.warn(
+                "poll_interval is deprecated, use max_poll_interval instead.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+            max_poll_interval = poll_interval
         self._user_id = user_id
         self._locale = locale
         self._timeout = timeout
-        self._poll_interval = poll_interval
+        self._min_poll_interval = min_poll_interval
+        self._max_poll_interval = max_poll_interval
+        self._typing_poll_interval = typing_poll_interval
         self._save_to = save_to
+        # Opened on the first write and appended to, so that each turn writes
+        # one line only.
+        self._save_fp = None
 
         self._agent_key = os.getenv("MCS_AGENT_KEY")
-        self._conversation_base_url = (
-            os.getenv(
-                "DIRECTLINE_BASE_URL",
-                "https://directline.botframework.com/v3/directline",
-            )
-            + "/conversations"
+        self._base_url = os.getenv(
+            "DIRECTLINE_BASE_URL",
+            "https://directline.botframework.com/v3/directline",
         )
+        self._conversation_base_url = self._base_url + "/conversations"
         self._conversation_id = None
         self._token = None
+        self._token_expires_at = None
+        # Set once the conversation is started, see _start_conversation.
+        self._auth_headers = None
+        self._activities_url = None
         self._logs = {}
-        self._watermark = None
+        # Always request activities after a watermark so that only new
+        # activities are downloaded, starting from the beginning.
+        self._watermark = "0"
+        self._stream_url = None
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "MCSAgent":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the HTTP session shared by all requests of this agent. The session
+        is created lazily and keeps connections to Direct Line alive across
+        turns and polls, so they are not re-established on every request.
+        Returns:
+            aiohttp.ClientSession: The shared session.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=75)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+                json_serialize=lambda obj: orjson.dumps(obj).decode(),
+            )
+        return self._session
+
+    async def aclose(self) -> None:
+        """
+        Close the HTTP session shared by all requests of this agent, and the
+        file the responses are saved to.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._save_fp is not None:
+            self._save_fp.close()
+            self._save_fp = None
+
+    async def _request(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        url: str,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> dict:
+        """
+        Send a request to Direct Line and return the decoded JSON response.
+        Transient failures are retried with exponential backoff and jitter.
+        Args:
+            session (aiohttp.ClientSession): The session to use for the request.
+            method (str): The HTTP method, e.g. "GET" or "POST".
+            url (str): The URL of the request.
+            idempotent (bool): Whether the request can be repeated safely. If
+                not, it is not retried after the server may have received it.
+            **kwargs: Additional arguments passed to session.request.
+        Returns:
+            dict: The decoded JSON response, empty if the response has no body.
+        """
+        for attempt in range(MAX_REQUEST_ATTEMPTS):
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+                    return orjson.loads(body) if body else {}
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == MAX_REQUEST_ATTEMPTS - 1 or not _is_retryable(
+                    e, idempotent
+                ):
+                    raise
+                delay = RETRY_BASE_DELAY * 2**attempt
+                await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def _save_response(self, response: dict) -> None:
+        """
+        Append the full response of a turn to the save file, if any. The write
+        runs in a worker thread so that it does not block the event loop.
+        Args:
+            response (dict): The full response to save.
+        """
+        if not self._save_to:
+            return
+        if self._save_fp is None:
+            self._save_fp = open(self._save_to, "ab")
+        line = orjson.dumps(response) + b"\n"
+        await asyncio.to_thread(self._write_line, line)
 
-        self._full_response = []
+    def _write_line(self, line: bytes) -> None:
+        """
+        Write a line to the save file and flush it, so that each turn is on disk
+        once saved. The buffered file writes all the bytes of the line.
+        Args:
+            line (bytes): The line to write.
+        """
+        self._save_fp.write(line)
+        self._save_fp.flush()
 
     async def _send_query(self, query: str, session: aiohttp.ClientSession) -> str:
         """
@@ -69,19 +222,52 @@ class MCSAgent:
             "from": {"id": self._user_id},
             "text": query,
         }
-        conversation_url = (
-            f"{self._conversation_base_url}/{self._conversation_id}/activities"
+        await self._ensure_token(session)
+        # The query is not resent once the server may have received it, as the
+        # agent would then answer it twice.
+        resp_json = await self._request(
+            session,
+            "POST",
+            self._activities_url,
+            idempotent=False,
+            headers=self._auth_headers,
+            json=data,
         )
-        headers = {
+        return resp_json.get("id")
+
+    def _set_token(self, token: str, expires_in: int) -> None:
+        """
+        Set the conversation token, the headers authorized with it, and the time
+        at which it needs to be refreshed.
+        Args:
+            token (str): The conversation token.
+            expires_in (int): Seconds until the token expires.
+        """
+        self._token = token
+        self._auth_headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self._token}",
         }
-        async with session.post(
-            conversation_url, headers=headers, json=data
-        ) as response:
-            response.raise_for_status()
-            resp_json = await response.json()
-            return resp_json.get("id")
+        if expires_in:
+            self._token_expires_at = time.time() + expires_in - TOKEN_REFRESH_MARGIN
+
+    async def _ensure_token(self, session: aiohttp.ClientSession) -> None:
+        """
+        Refresh the conversation token when it is about to expire, so that the
+        next request does not fail as unauthorized:
+        https://learn.microsoft.com/en-us/azure/bot-service/rest-api/bot-framework-rest-direct-line-3-0-authentication#refresh-a-direct-line-token
+        Args:
+            session (aiohttp.ClientSession): The session to use for the request.
+        """
+        if self._token_expires_at is None or time.time() < self._token_expires_at:
+            return
+        response_json = await self._request(
+            session,
+            "POST",
+            f"{self._base_url}/tokens/refresh",
+            headers=self._auth_headers,
+        )
+        self._set_token(response_json.get("token"), response_json.get("expires_in"))
 
     async def _start_conversation(self, session: aiohttp.ClientSession):
         """
@@ -89,6 +275,10 @@ class MCSAgent:
         before sending any queries whether to start a new conversation or to
         continue an existing one:
         https://learn.microsoft.com/en-us/azure/bot-service/rest-api/bot-framework-rest-direct-line-3-0-start-conversation
+        An existing conversation is reconnected from the current watermark:
+        https://learn.microsoft.com/en-us/azure/bot-service/rest-api/bot-framework-rest-direct-line-3-0-reconnect-to-conversation
+        Both calls return a fresh stream URL to receive activities over a
+        WebSocket.
         Args:
             session (aiohttp.ClientSession): The session to use for the request.
         """
@@ -98,74 +288,194 @@ class MCSAgent:
                 "Authorization": f"Bearer {self._agent_key}",
             }
         else:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self._token}",
-            }
-        async with session.post(
-            self._conversation_base_url, headers=headers
-        ) as response:
-            response.raise_for_status()
-            response_json = await response.json()
-            if self._conversation_id is None:
-                self._conversation_id = response_json.get("conversationId")
-            if self._token is None:
-                self._token = response_json.get("token")
-
-    async def _poll_for_response(self, session: aiohttp.ClientSession):
+            await self._ensure_token(session)
+            headers = self._auth_headers
+        if self._conversation_id is None:
+            response_json = await self._request(
+                session, "POST", self._conversation_base_url, headers=headers
+            )
+        else:
+            conversation_url = (
+                f"{self._conversation_base_url}/"
+                f"{self._conversation_id}?watermark={self._watermark}"
+            )
+            response_json = await self._request(
+                session, "GET", conversation_url, headers=headers
+            )
+        if self._conversation_id is None:
+            self._conversation_id = response_json.get("conversationId")
+        if self._token is None:
+            self._set_token(response_json.get("token"), response_json.get("expires_in"))
+            self._activities_url = (
+                f"{self._conversation_base_url}/{self._conversation_id}/activities"
+            )
+        self._stream_url = response_json.get("streamUrl")
+
+    @staticmethod
+    def _bot_messages(activities: list) -> list:
+        """
+        Extract the bot messages from a list of Direct Line activities.
+        Args:
+            activities (list): The activities received from the conversation.
+        Returns:
+            list: A list of dictionaries with the message data and timestamp.
+        """
+        messages = []
+        for activity in activities:
+            role = (activity.get("from") or {}).get("role")
+            if role != "bot" or activity.get("type") != "message":
+                continue
+            text = activity.get("text") or activity.get("speak")
+            if not text:
+                continue
+            messages.append({"data": text, "timestamp": activity.get("timestamp")})
+        return messages
+
+    @staticmethod
+    def _turn_ended(activities: list, bot_responded: bool) -> bool:
+        """
+        Check whether the bot is done with the turn, i.e. it ended the
+        conversation, or it accepts input again after responding.
+        Args:
+            activities (list): The new activities received from the conversation.
+            bot_responded (bool): Whether a bot message was received in the turn.
+        Returns:
+            bool: True if the turn is over.
+        """
+        return any(
+            (activity.get("from") or {}).get("role") == "bot"
+            and (
+                activity.get("type") == "endOfConversation"
+                or (bot_responded and activity.get("inputHint") == "acceptingInput")
+            )
+            for activity in activities
+        )
+
+    async def _stream_for_response(self, ws: aiohttp.ClientWebSocketResponse):
+        """
+        Receive the agent response from the conversation WebSocket stream.
+        Returns once the bot ends the turn (see _turn_ended), after a quiet
+        period following its messages, or when the timeout elapses.
+        https://learn.microsoft.com/en-us/azure/bot-service/rest-api/bot-framework-rest-direct-line-3-0-receive-activities#websocket
+        Args:
+            ws (aiohttp.ClientWebSocketResponse): The connected stream.
+        Returns:
+            dict: A dictionary containing the full response, the agent response,
+            and the processing time.
+        """
+        start_time = time.time()
+        activities = []
+        bot_response = []
+
+        async def consume():
+            while True:
+                # A bot may send several messages in a turn, keep reading until
+                # it is quiet for a while once it has responded.
+                try:
+                    message = await ws.receive(
+                        timeout=TURN_QUIET_PERIOD if bot_response else None
+                    )
+                except asyncio.TimeoutError:
+                    return
+                if message.type in (
+                    aiohttp.WSMsgType.CLOSE,
+                    aiohttp.WSMsgType.CLOSING,
+                    aiohttp.WSMsgType.CLOSED,
+                    aiohttp.WSMsgType.ERROR,
+                ):
+                    return
+                # Empty text frames are keep-alives sent by the service.
+                if message.type != aiohttp.WSMsgType.TEXT or not message.data:
+                    continue
+                activity_set = orjson.loads(message.data)
+                new_activities = activity_set.get("activities", [])
+                activities.extend(new_activities)
+                bot_response.extend(self._bot_messages(new_activities))
+                if activity_set.get("watermark"):
+                    self._watermark = activity_set["watermark"]
+                if self._turn_ended(new_activities, bool(bot_response)):
+                    return
+
+        try:
+            await asyncio.wait_for(consume(), timeout=self._timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        result = {
+            "response": {"activities": activities, "watermark": self._watermark},
+            "bot_response": bot_response,
+            "conversation_id": self._conversation_id,
+            "processing_time": int(time.time() - start_time),
+        }
+
+        return result
+
+    async def _poll_for_response(
+        self, session: aiohttp.ClientSession, timeout: float = None
+    ):
         """
         Poll for the agent response.
         https://learn.microsoft.com/en-us/azure/bot-service/rest-api/bot-framework-rest-direct-line-3-0-receive-activities
         Args:
             session (aiohttp.ClientSession): The session to use for the request.
+            timeout (float): Optional maximum seconds to poll for, defaults to the
+                agent timeout.
         Returns:
             dict: A dictionary containing the full response, the agent response,
             and the processing time.
         """
-        if self._watermark is None:
-            conversation_url = (
-                f"{self._conversation_base_url}/{self._conversation_id}/activities"
-            )
-        else:
-            conversation_url = (
-                f"{self._conversation_base_url}/"
-                f"{self._conversation_id}/activities?watermark="
-                f"{self._watermark}"
-            )
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self._token}",
-        }
         start_time = time.time()
+        activities = []
         bot_response = []
-        while time.time() - start_time < self._timeout:
-            async with session.get(conversation_url, headers=headers) as response:
-                response.raise_for_status()
-                response_json = await response.json()
-                bot_response = [
-                    {
-                        "data": activity.get("text") or activity.get("speak"),
-                        "timestamp": activity.get("timestamp"),
-                    }
-                    for activity in response_json.get("activities", [])
-                    if activity.get("from", {}).get("role") == "bot"
-                    and activity.get("type") == "message"
-                    and (activity.get("text") or activity.get("speak"))
-                ]
-                new_watermark = response_json.get("watermark")
-                if (
-                    self._watermark
-                    and new_watermark
-                    and self._watermark == new_watermark
-                    and bot_response
-                ):
-                    break
-                self._watermark = new_watermark
-                print(f"Waiting for bot response, current watermark: {self._watermark}")
-                await asyncio.sleep(self._poll_interval)
+        delay = self._min_poll_interval
+        last_activity_time = start_time
+        bot_typing = False
+        if timeout is None:
+            timeout = self._timeout
+        while time.time() - start_time < timeout:
+            # Only activities after the watermark are returned, so each poll
+            # processes the new activities only.
+            conversation_url = f"{self._activities_url}?watermark={self._watermark}"
+            await self._ensure_token(session)
+            response_json = await self._request(
+                session, "GET", conversation_url, headers=self._auth_headers
+            )
+            new_activities = response_json.get("activities", [])
+            # A bot may send several messages in a turn, the turn is only over
+            # once it has been quiet for a while after responding.
+            if (
+                bot_response
+                and not new_activities
+                and time.time() - last_activity_time >= TURN_QUIET_PERIOD
+            ):
+                break
+            activities.extend(new_activities)
+            bot_response.extend(self._bot_messages(new_activities))
+            if response_json.get("watermark"):
+                self._watermark = response_json["watermark"]
+            # The bot is done with the turn once it accepts input again or ends
+            # the conversation, no need to wait for a quiet poll.
+            if self._turn_ended(new_activities, bool(bot_response)):
+                break
+            if new_activities:
+                # New activity arrived, poll again quickly.
+                last_activity_time = time.time()
+                delay = self._min_poll_interval
+                bot_typing = bot_typing or any(
+                    activity.get("type") == "typing" for activity in new_activities
+                )
+            # Keep the cadence tight while the bot is typing its first message.
+            max_delay = (
+                self._typing_poll_interval
+                if bot_typing and not bot_response
+                else self._max_poll_interval
+            )
+            print(f"Waiting for bot response, current watermark: {self._watermark}")
+            await asyncio.sleep(delay)
+            delay = min(delay * POLL_BACKOFF_FACTOR, max_delay)
 
         result = {
-            "response": response_json,
+            "response": {"activities": activities, "watermark": self._watermark},
             "bot_response": bot_response,
             "conversation_id": self._conversation_id,
             "processing_time": int(time.time() - start_time),
@@ -182,23 +492,35 @@ class MCSAgent:
             dict: A dictionary containing the user ID, conversation ID, response,
             logs, and processing time.
         """
-        async with aiohttp.ClientSession() as session:
-            await self._start_conversation(session)
+        session = await self._get_session()
+        await self._start_conversation(session)
+        ws = None
+        if self._stream_url:
+            # Connect before sending so that no reply can be missed. The stream
+            # URL is valid for a single connection.
+            stream_url, self._stream_url = self._stream_url, None
+            try:
+                ws = await session.ws_connect(stream_url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Failed to connect to the stream, polling instead: {e}")
+        if ws is not None:
+            try:
+                await self._send_query(query, session)
+                result = await self._stream_for_response(ws)
+            finally:
+                await ws.close()
+        else:
             await self._send_query(query, session)
             result = await self._poll_for_response(session)
-            agent_response = {
-                "user_id": self._user_id,
-                "conversation_id": self._conversation_id,
-                "response": result.get("bot_response"),
-                "logs": self._logs,
-                "processing_time": result.get("processing_time"),
-            }
+        agent_response = {
+            "user_id": self._user_id,
+            "conversation_id": self._conversation_id,
+            "response": result.get("bot_response"),
+            "logs": self._logs,
+            "processing_time": result.get("processing_time"),
+        }
 
-        if self._save_to:
-            # Save the full response
-            self._full_response.append(result.get("response"))
-            with open(self._save_to, "w") as f:
-                json.dump(self._full_response, f, indent=2)
+        await self._save_response(result.get("response"))
         return agent_response
 
     async def close_conversation(self) -> dict:
@@ -210,37 +532,29 @@ class MCSAgent:
             dict: A dictionary containing the user ID, conversation ID, response,
             logs, and processing time.
         """
-        if self._conversation_id is not None:
-            conversation_url = (
-                f"{self._conversation_base_url}/{self._conversation_id}/activities"
-            )
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self._token}",
-            }
-            data = {
-                "type": "endOfConversation",
-                "from": {"id": self._user_id},
-            }
+        data = {
+            "type": "endOfConversation",
+            "from": {"id": self._user_id},
+        }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                conversation_url, headers=headers, json=data
-            ) as response:
-                response.raise_for_status()
-                result = await self._poll_for_response(session)
-                agent_response = {
-                    "user_id": self._user_id,
-                    "conversation_id": self._conversation_id,
-                    "response": result.get("bot_response"),
-                    "logs": self._logs,
-                    "processing_time": result.get("processing_time"),
-                }
-                if self._save_to:
-                    # Save the full response
-                    self._full_response.append(result.get("response"))
-                    with open(self._save_to, "w") as f:
-                        json.dump(self._full_response, f, indent=2)
+        session = await self._get_session()
+        await self._ensure_token(session)
+        await self._request(
+            session, "POST", self._activities_url, headers=self._auth_headers, json=data
+        )
+        # A farewell message, if any, follows the endOfConversation right away,
+        # so there is no need to wait for the full agent timeout.
+        result = await self._poll_for_response(
+            session, timeout=CLOSE_CONVERSATION_TIMEOUT
+        )
+        agent_response = {
+            "user_id": self._user_id,
+            "conversation_id": self._conversation_id,
+            "response": result.get("bot_response"),
+            "logs": self._logs,
+            "processing_time": result.get("processing_time"),
+        }
+        await self._save_response(result.get("response"))
 
         return agent_response
 
@@ -256,10 +570,11 @@ class MCSAgent:
 
 if __name__ == "__main__":
     # Example usage of the async MCSAgent
-    agent = MCSAgent(user_id="test_user")
-    response = asyncio.run(
-        agent.get_response(
-            "can you help me learn about food chain and quiz me?",
-            save_to="response.json",
-        )
-    )
+
+    async def main():
+        async with MCSAgent(user_id="test_user", save_to="response.jsonl") as agent:
+            return await agent.get_response(
+                "can you help me learn about food chain and quiz me?"
+            )
+
+    response = asyncio.run(main())
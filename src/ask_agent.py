@@ -2,6 +2,12 @@ import asyncio
 
 from agents import MCSAgent
 
+try:
+    import uvloop
+except ImportError:
+    # uvloop is not available on Windows, fall back to the default event loop.
+    uvloop = None
+
 
 async def close_conversation(agent: MCSAgent) -> None:
     """
@@ -54,10 +60,10 @@ async def chat(agent: MCSAgent) -> bool:
 async def main() -> None:
     chatting = True
     user_id = "test_user"
-    agent = MCSAgent(user_id=user_id, save_to="response.json")
-    while chatting:
-        chatting = await chat(agent=agent)
+    async with MCSAgent(user_id=user_id, save_to="response.jsonl") as agent:
+        while chatting:
+            chatting = await chat(agent=agent)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
@@ -1,7 +1,10 @@
 import asyncio
+import functools
+import hashlib
 import json
 import logging
 import os
+from collections import OrderedDict
 from typing import TypedDict
 
 from dotenv import load_dotenv
@@ -14,6 +17,27 @@ load_dotenv()
 EVALUATOR_NAME = "LLMJudgedRoutingAccuracyEvaluator"
 EVALUATOR_DESCRIPTION = "Evaluates the routing accuracy of a conversation using LLM. "
 
+# Maximum number of LLM judgments kept in memory by an evaluator instance.
+CACHE_MAX_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=8)
+def _load_flow(prompty_path: str, config_key: tuple) -> AsyncPrompty:
+    """
+    Load the prompty flow once per prompty file and model configuration, so that
+    evaluator instances sharing a configuration do not re-parse the prompty.
+
+    Args:
+        prompty_path (str): Path to the prompty file.
+        config_key (tuple): Sorted (key, value) pairs of the model configuration.
+    Returns:
+        AsyncPrompty: The loaded prompty flow.
+    """
+    return AsyncPrompty.load(
+        source=prompty_path,
+        model={"configuration": dict(config_key)},
+    )
+
 
 class LLMJudgedRoutingAccuracyResult(TypedDict):
     """
@@ -41,12 +65,39 @@ class LLMJudgedRoutingAccuracyEvaluator:
 
         model_config = normalize_model_config(model_config)
 
-        self._flow = AsyncPrompty.load(
-            source=prompty_path,
-            model={"configuration": model_config},
-        )
+        # The key includes the api_key, so that a rotated key loads a new flow.
+        self._flow = _load_flow(prompty_path, tuple(sorted(model_config.items())))
 
         self._step_types_to_evaluate = step_types_to_evaluate
+        self._cache = OrderedDict()
+        self._agent_info_cache = {}
+
+    def _agent_description(self, agent_dictionary: dict) -> str:
+        """
+        Return the formatted agent information, extracted once per distinct agent.
+        All rows of a dataset usually share the same agent dictionary.
+
+        Args:
+            agent_dictionary (dict): Dictionary containing agent information.
+        Returns:
+            str: Formatted agent information, see extract_agent_info.
+        """
+        # Keyed on the fields read by extract_agent_info, not on id(), which can
+        # be reused by another dictionary once the first one is freed.
+        key = (
+            agent_dictionary.get("agent_name"),
+            agent_dictionary.get("agent_description"),
+            agent_dictionary.get("agent_instructions"),
+            tuple(
+                (sub.get("name"), sub.get("description"), sub.get("instructions"))
+                for sub in agent_dictionary.get("sub_agents", [])
+            ),
+        )
+        agent_description = self._agent_info_cache.get(key)
+        if agent_description is None:
+            agent_description = extract_agent_info(agent_dictionary)
+            self._agent_info_cache[key] = agent_description
+        return agent_description
 
     async def evaluate(
         self, *, conversation: str, agent_description: str
@@ -58,6 +109,15 @@ class LLMJudgedRoutingAccuracyEvaluator:
             conversation (str): Formatted conversation string.
             agent_description (str): Agent descriptions.
         """
+        # Identical inputs are judged once, the result is served from the cache
+        # afterwards.
+        key = hashlib.blake2b(
+            (conversation + "\x00" + agent_description).encode(), digest_size=16
+        ).hexdigest()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
         try:
             response = await self._flow(
                 conversation=conversation, agent_description=agent_description
@@ -65,6 +125,10 @@ class LLMJudgedRoutingAccuracyEvaluator:
         except Exception as e:
             logger.error(f"Error during LLM evaluation: {e}")
             raise
+
+        self._cache[key] = response
+        if len(self._cache) > CACHE_MAX_SIZE:
+            self._cache.popitem(last=False)
         return response
 
     def __call__(self, *, conversation: list, agent_dictionary: dict):
@@ -80,7 +144,7 @@ class LLMJudgedRoutingAccuracyEvaluator:
         formatted_conversation = extract_conversation(
             conversation, self._step_types_to_evaluate
         )
-        agent_description = extract_agent_info(agent_dictionary)
+        agent_description = self._agent_description(agent_dictionary)
 
         return asyncio.run(
             self.evaluate(
@@ -88,11 +152,57 @@ class LLMJudgedRoutingAccuracyEvaluator:
             )
         )
 
+    async def aevaluate_many(self, items: list, concurrency: int = 8) -> list:
+        """
+        Evaluate many conversations concurrently, with at most `concurrency`
+        LLM calls in flight at a time.
+
+        Args:
+            items (list): List of (conversation, agent_dictionary) tuples.
+            concurrency (int, optional): Maximum number of concurrent LLM calls.
+        Returns:
+            list: LLMJudgedRoutingAccuracyResult of each item, in input order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def evaluate_item(conversation: list, agent_dictionary: dict):
+            formatted_conversation = extract_conversation(
+                conversation, self._step_types_to_evaluate
+            )
+            agent_description = self._agent_description(agent_dictionary)
+            async with semaphore:
+                return await self.evaluate(
+                    conversation=formatted_conversation,
+                    agent_description=agent_description,
+                )
+
+        return await asyncio.gather(
+            *(evaluate_item(conversation, agent) for conversation, agent in items)
+        )
+
+    def evaluate_many(self, items: list, concurrency: int = 8) -> list:
+        """
+        Evaluate many conversations in a single event loop, see aevaluate_many.
+
+        Args:
+            items (list): List of (conversation, agent_dictionary) tuples.
+            concurrency (int, optional): Maximum number of concurrent LLM calls.
+        Returns:
+            list: LLMJudgedRoutingAccuracyResult of each item, in input order.
+        """
+        return asyncio.run(self.aevaluate_many(items, concurrency=concurrency))
+
 
 # Example usage:
 
 if __name__ == "__main__":
 
+    try:
+        import uvloop
+    except ImportError:
+        # uvloop is not available on Windows, fall back to the default event loop.
+        uvloop = None
+
     model_config = {
         "subscription_id": os.environ["AZURE_SUBSCRIPTION_ID"],
         "resource_group": os.environ["AZURE_RESOURCE_GROUP"],
@@ -134,9 +244,11 @@ if __name__ == "__main__":
         ],
     }
 
-    result = evaluator(
-        conversation=conversation,
-        agent_dictionary=agent_dictionary,
-    )
+    # Same as evaluator(conversation=..., agent_dictionary=...), run in a loop
+    # created by uvloop when available.
+    result = asyncio.run(
+        evaluator.aevaluate_many([(conversation, agent_dictionary)]),
+        loop_factory=uvloop.new_event_loop if uvloop else None,
+    )[0]
 
     print("Evaluation Result:", json.dumps(result, indent=2))
@@ -1,15 +1,27 @@
 import os
-import re
+from functools import lru_cache
+from operator import itemgetter
 from typing import Optional, TypedDict
 
 from azure.ai.evaluation import AzureOpenAIModelConfiguration
-from azure.ai.ml import MLClient
-from azure.ai.ml.identity import AzureMLOnBehalfOfCredential
-from azure.identity import DefaultAzureCredential
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Azure OpenAI settings, read once at import, after the .env file is loaded.
+AZURE_OPENAI_API_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION")
+
+# Required fields of a ModelConfigInput, read in a single call.
+_get_model_config_fields = itemgetter(
+    "subscription_id",
+    "resource_group",
+    "project_name",
+    "connection_name",
+    "azure_deployment",
+)
+
 
 class ModelConfigInput(TypedDict):
     subscription_id: str
@@ -20,6 +32,63 @@ class ModelConfigInput(TypedDict):
     api_version: Optional[str]
 
 
+@lru_cache(maxsize=1)
+def _get_default_credential():
+    """Return the DefaultAzureCredential shared by all connection lookups."""
+    from azure.identity import DefaultAzureCredential
+
+    return DefaultAzureCredential()
+
+
+@lru_cache(maxsize=32)
+def _resolve_connection(
+    subscription_id: str, resource_group: str, project_name: str, connection_name: str
+) -> tuple:
+    """
+    Retrieve the API key and endpoint of an Azure OpenAI connection of a project.
+    The result is cached, so that the connection is looked up once per process
+    rather than once per evaluator.
+    Args:
+        subscription_id (str): Azure subscription ID.
+        resource_group (str): Resource group of the project.
+        project_name (str): Name of the Azure AI Foundry hub project.
+        connection_name (str): Name of the Azure OpenAI connection.
+    Returns:
+        tuple: The (api_key, azure_endpoint) of the connection.
+    """
+    # Imported here as these packages are slow to import, and not needed when
+    # the Azure OpenAI key and endpoint are set in the environment.
+    from azure.ai.ml import MLClient
+    from azure.ai.ml.identity import AzureMLOnBehalfOfCredential
+
+    try:
+        # Use default Azure credential to retrieve connection details.
+        ml_client = MLClient(
+            subscription_id=subscription_id,
+            resource_group_name=resource_group,
+            workspace_name=project_name,
+            credential=_get_default_credential(),
+        )
+
+        connection = ml_client.connections.get(
+            name=connection_name, populate_secrets=True
+        )
+    except Exception:
+        # Fallback to AzureMLOnBehalfOfCredential if DefaultAzureCredential fails.
+        # This credential is used for scenarios where the application is running
+        # on Azure Foundry Hub project managed compute.
+        ml_client = MLClient(
+            subscription_id=subscription_id,
+            resource_group_name=resource_group,
+            workspace_name=project_name,
+            credential=AzureMLOnBehalfOfCredential(),
+        )
+        connection = ml_client.connections.get(
+            name=connection_name, populate_secrets=True
+        )
+    return connection.credentials.get("key", None), connection.api_base
+
+
 def normalize_model_config(
     model_config_input: ModelConfigInput,
 ) -> AzureOpenAIModelConfiguration:
@@ -31,54 +100,26 @@ def normalize_model_config(
         AzureOpenAIModelConfiguration: A normalized model configuration object.
     """
 
-    subscription_id = model_config_input["subscription_id"]
-    resource_group = model_config_input["resource_group"]
-    project_name = model_config_input["project_name"]
-    connection_name = model_config_input["connection_name"]
-    azure_deployment = model_config_input["azure_deployment"]
+    (
+        subscription_id,
+        resource_group,
+        project_name,
+        connection_name,
+        azure_deployment,
+    ) = _get_model_config_fields(model_config_input)
     api_version = model_config_input.get("api_version")
 
-    if os.environ.get("AZURE_OPENAI_API_KEY") and os.environ.get(
-        "AZURE_OPENAI_ENDPOINT"
-    ):
-        api_key = os.environ["AZURE_OPENAI_API_KEY"]
-        azure_endpoint = os.environ["AZURE_OPENAI_ENDPOINT"]
+    if AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
+        api_key = AZURE_OPENAI_API_KEY
+        azure_endpoint = AZURE_OPENAI_ENDPOINT
     else:
-        try:
-            # Use default Azure credential to retrieve connection details.
-            ml_client = MLClient(
-                subscription_id=subscription_id,
-                resource_group_name=resource_group,
-                workspace_name=project_name,
-                credential=DefaultAzureCredential(),
-            )
-
-            connection = ml_client.connections.get(
-                name=connection_name, populate_secrets=True
-            )
-            api_key = connection.credentials.get("key", None)
-            azure_endpoint = connection.api_base
-        except Exception:
-            # Fallback to AzureMLOnBehalfOfCredential if DefaultAzureCredential fails.
-            # This credential is used for scenarios where the application is running
-            # on Azure Foundry Hub project managed compute.
-            ml_client = MLClient(
-                subscription_id=subscription_id,
-                resource_group_name=resource_group,
-                workspace_name=project_name,
-                credential=AzureMLOnBehalfOfCredential(),
-            )
-            connection = ml_client.connections.get(
-                name=connection_name, populate_secrets=True
-            )
-            api_key = connection.credentials.get("key", None)
-            azure_endpoint = connection.api_base
+        api_key, azure_endpoint = _resolve_connection(
+            subscription_id, resource_group, project_name, connection_name
+        )
 
     model_config = AzureOpenAIModelConfiguration(
-        azure_endpoint=azure_endpoint or os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_version=api_version
-        or os.environ["AZURE_OPENAI_API_VERSION"]
-        or "2025-01-01-preview",
+        azure_endpoint=azure_endpoint or AZURE_OPENAI_ENDPOINT,
+        api_version=api_version or AZURE_OPENAI_API_VERSION or "2025-01-01-preview",
         api_key=api_key,
         azure_deployment=azure_deployment,
     )
@@ -101,44 +142,28 @@ def extract_conversation(
         str: A formatted string representing the conversation sequence.
     """
 
-    results = []
+    formatted_results = []
     for turn in conversation:
         role = turn.get("role")
         content = turn.get("content", "")
-        entry = {"role": role, "content": content}
         if role == "assistant":
-            agent_steps = []
-            steps_completed = turn.get("steps_completed", [])
-            if steps_completed:
-                if step_types_to_evaluate is not None:
-                    agent_steps = [
-                        step.get("name")
-                        for step in steps_completed
-                        if step.get("type") in step_types_to_evaluate
-                    ]
-                else:
-                    agent_steps = [step.get("name") for step in steps_completed]
-            agent_steps_str = ", ".join(agent_steps)
-            entry["agent_steps"] = agent_steps_str
-        results.append(entry)
-
-    # Join the results into a formatted string
-    formatted_results = []
-    for entry in results:
-        if "agent_steps" in entry:
+            steps_completed = turn.get("steps_completed") or []
+            if step_types_to_evaluate is not None:
+                agent_steps = ", ".join(
+                    step.get("name")
+                    for step in steps_completed
+                    if step.get("type") in step_types_to_evaluate
+                )
+            else:
+                agent_steps = ", ".join(step.get("name") for step in steps_completed)
             formatted_results.append(
-                f"{entry['role'].upper()}: {entry['content']} \n(AGENT STEPS: {entry['agent_steps']})\n\n"  # noqa: E501
+                f"{role.upper()}: {content} \n(AGENT STEPS: {agent_steps})\n\n"
             )
         else:
-            formatted_results.append(f"{entry['role'].upper()}: {entry['content']}")
+            formatted_results.append(f"{role.upper()}: {content}")
 
     # Join all entries with newlines
-    results = "\n".join(formatted_results)
-
-    # Return the final formatted string
-    if not results:
-        return "No conversation data available."
-    return results
+    return "\n".join(formatted_results) or "No conversation data available."
 
 
 def extract_agent_info(agent_dictionary: dict) -> str:
@@ -156,21 +181,29 @@ def extract_agent_info(agent_dictionary: dict) -> str:
         """Clean the text by removing leading non-alphanumeric characters."""
         if not text:
             return text
-        # Remove leading non-alphanumeric characters (including newlines)
-        cleaned = re.sub(r"^[^\w]+", "", text)
-        return cleaned
+        # Stops at the first word character, rather than having a regex engine
+        # try to anchor at every position of the text.
+        start = 0
+        while start < len(text) and not (text[start].isalnum() or text[start] == "_"):
+            start += 1
+        return text[start:]
 
     def extract_string(input: str, prefixes: list, postfixes: list) -> str:
         """
         Extract a specific section from an input string based on possible
         prefixes and postfixes.
         """
+        # Both delimiters are literals, a plain substring search finds the same
+        # section as a non-greedy regex would.
         for prefix in prefixes:
+            start = input.find(prefix)
+            if start < 0:
+                continue
+            start += len(prefix)
             for postfix in postfixes:
-                pattern = re.escape(prefix) + r"(.*?)" + re.escape(postfix)
-                match = re.search(pattern, input, re.DOTALL)
-                if match:
-                    return match.group(1).strip()
+                end = input.find(postfix, start)
+                if end >= 0:
+                    return input[start:end].strip()
         return None
 
     principal_name = agent_dictionary.get("agent_name", "")
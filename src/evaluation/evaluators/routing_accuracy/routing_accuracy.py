@@ -1,5 +1,8 @@
 import logging
-from typing import List, Set, TypedDict
+import sys
+from collections import Counter
+from functools import lru_cache
+from typing import List, TypedDict
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +13,11 @@ EVALUATOR_DESCRIPTION = (
 
 
 class RoutingAccuracyResult(TypedDict):
+    """
+    Routing accuracy metrics of a route. Precision and recall are not rounded,
+    so that averages over a dataset are exact; round them when reporting.
+    """
+
     ordered_match: int
     unordered_match: int
     superset_match: int
@@ -26,180 +34,135 @@ class RoutingAccuracyResult(TypedDict):
     reference_route_evaluated: List[str]
 
 
-class RoutingAccuracyEvaluator:
+# Names of the scalar metrics, in the order they are returned by _compute_metrics.
+METRIC_NAMES = (
+    "ordered_match",
+    "unordered_match",
+    "superset_match",
+    "subset_match",
+    "precision",
+    "recall",
+    "unordered_match_dedup",
+    "superset_match_dedup",
+    "subset_match_dedup",
+    "precision_dedup",
+    "recall_dedup",
+)
+
+
+def _max_matching_count(route_counter: Counter, reference_counter: Counter) -> int:
     """
-    A class to evaluate the routing accuracy of a given route against a reference route.
-    This class provides methods to evaluate various metrics such as ordered match,
-    unordered match, superset match, subset match, precision, recall, and step stats.
+    Count the steps of a route matched to steps of a reference route, each step
+    being matched at most once, i.e. the size of a maximum bipartite matching
+    between the routes where steps with the same name are linked.
+
+    With matching on equal names, it is the size of the multiset intersection.
+    Were steps matched on a similarity score instead, this would become an
+    assignment problem, e.g. scipy.optimize.linear_sum_assignment.
+
+    Args:
+        route_counter (Counter): Number of occurrences of each step in the route.
+        reference_counter (Counter): Same for the reference route.
+    Returns:
+        int: The number of matched steps.
     """
+    return (route_counter & reference_counter).total()
 
-    def __init__(self, step_types_to_evaluate: list = ["agent"]):
-        """
-        Initialize the evaluator with optional step types to evaluate.
-        If step_types_to_evaluate is provided, only those steps will be evaluated.
-        """
-        self._step_types_to_evaluate = step_types_to_evaluate
 
-    def _ordered_match(self, route: List[str], reference_route: List[str]) -> int:
-        """
-        Check if the route is a strict ordered match of the reference route.
-        Returns 1 if match, 0 otherwise.
-        """
-        return int(route == reference_route)
+@lru_cache(maxsize=4096)
+def _compute_metrics(route: tuple, reference_route: tuple) -> tuple:
+    """
+    Compute the routing metrics of a route against a reference route. Datasets
+    repeat the same few routes, so the results are cached; only immutable values
+    are returned, the caller builds a fresh result dict from them.
 
-    def _unordered_match(self, route: List[str], reference_route: List[str]) -> int:
-        """
-        Check if the route is an unordered match of the reference route.
-        Returns 1 if match, 0 otherwise.
-        """
-        return int(sorted(route) == sorted(reference_route))
+    Multiset metrics match each step of a route at most once to a step of the
+    other route, dedup metrics compare the routes as sets of steps.
 
-    def _unordered_match_dedup(
-        self, route: List[str], reference_route: List[str]
-    ) -> int:
-        """
-        Check if the deduplicated route is an unordered match of the
-        deduplicated reference route. Returns 1 if match, 0 otherwise.
-        Deduplication is done using set().
-        """
-        return int(set(route) == set(reference_route))
+    Args:
+        route (tuple): Names of the steps of the route to evaluate.
+        reference_route (tuple): Names of the steps of the reference route.
+    Returns:
+        tuple: The metric values in METRIC_NAMES order, and a tuple of
+        (step, tp, fp, fn) for each step.
+    """
+    if route == reference_route:
+        # An exact match scores perfectly on every metric, except for the
+        # precision of an empty route which is defined as 0.0.
+        metrics = (1, 1, 1, 1, 1.0 if route else 0.0, 1.0, 1, 1, 1, 1.0, 1.0)
+        return metrics, tuple((step, 1, 0, 0) for step in set(route))
 
-    def _superset_match(self, route: List[str], reference_route: List[str]) -> int:
-        """
-        Check if the route is a superset of the reference route. Each element in
-        route can only be matched once to an element in reference_route.
-        Returns 1 if match, 0 otherwise.
-        """
-        matched_route_indices: Set[int] = set()
-        for ref_item in reference_route:
-            found_match = False
-            for idx, out_item in enumerate(route):
-                if idx in matched_route_indices:
-                    continue
-                if out_item == ref_item:
-                    matched_route_indices.add(idx)
-                    found_match = True
-                    break
-            if not found_match:
-                return 0
-        return 1
-
-    def _superset_match_dedup(
-        self, route: List[str], reference_route: List[str]
-    ) -> int:
-        """
-        Check if the deduplicated route is a superset of the deduplicated
-        reference route. Returns 1 if match, 0 otherwise.
-        """
-        route_set = set(route)
-        reference_set = set(reference_route)
-        return int(reference_set.issubset(route_set))
+    # All metrics are derived from the counters and sets built once here.
+    # The routes differ, so at most one of them is empty.
+    route_counter = Counter(route)
+    reference_counter = Counter(reference_route)
+    route_set = set(route_counter)
+    reference_set = set(reference_counter)
+    matches = _max_matching_count(route_counter, reference_counter)
+    common_steps = route_set & reference_set
+    matches_dedup = len(common_steps)
 
-    def _subset_match(self, route: List[str], reference_route: List[str]) -> int:
-        """
-        Check if the route is a subset of the reference route. Each element in route
-        can only be matched once to an element in reference_route.
-        Returns 1 if match, 0 otherwise.
-        """
-        return self._superset_match(reference_route, route)
+    route_length = len(route)
+    reference_length = len(reference_route)
 
-    def _subset_match_dedup(self, route: List[str], reference_route: List[str]) -> int:
-        """
-        Check if the deduplicated route is a subset of the deduplicated
-        reference route. Returns 1 if match, 0 otherwise.
-        """
-        route_set = set(route)
-        reference_set = set(reference_route)
-        return int(route_set.issubset(reference_set))
+    # Routes of different lengths cannot be permutations of each other, which
+    # settles unordered_match without comparing the counters. A route holds the
+    # other when every step of the other is matched, so the superset and subset
+    # matches follow from the match count; it cannot reach the length of the
+    # longer route.
+    unordered_match = int(
+        route_length == reference_length and route_counter == reference_counter
+    )
 
-    def _precision(self, route: List[str], reference_route: List[str]) -> float:
-        """
-        Calculate the precision of the route against the reference route.
-        Each element in reference_route can only be matched once.
-        """
-        if not route:
-            return 0.0
-        matched_ref_indices: Set[int] = set()
-        matches = 0
-        for out_item in route:
-            for idx, ref_item in enumerate(reference_route):
-                if idx in matched_ref_indices:
-                    continue
-                if out_item == ref_item:
-                    matched_ref_indices.add(idx)
-                    matches += 1
-                    break
-        return round(matches / len(route), 2)
-
-    def _precision_dedup(self, route: List[str], reference_route: List[str]) -> float:
-        """
-        Calculate the precision of the deduplicated route against the
-        deduplicated reference route. Precision = |intersection| / |route_set|.
-        Returns 1.0 if both sets are empty, 0.0 if only route_set is empty.
-        """
-        route_set = set(route)
-        reference_set = set(reference_route)
-        if not route_set:
-            if not reference_set:
-                return 1.0
-            return 0.0
-        matches = len(route_set & reference_set)
-        return round(matches / len(route_set), 2)
-
-    def _recall(self, route: List[str], reference_route: List[str]) -> float:
-        """
-        Calculate the recall of the route against the reference route.
-        Each element in route can only be matched once.
-        If both route and reference_route are empty, recall is 1.0.
-        """
-        if not reference_route:
-            if not route:
-                return 1.0
-            return 0.0
-        matched_out_indices: Set[int] = set()
-        matches = 0
-        for ref_item in reference_route:
-            for idx, out_item in enumerate(route):
-                if idx in matched_out_indices:
-                    continue
-                if out_item == ref_item:
-                    matched_out_indices.add(idx)
-                    matches += 1
-                    break
-        return round(matches / len(reference_route), 2)
-
-    def _recall_dedup(self, route: List[str], reference_route: List[str]) -> float:
+    metrics = (
+        0,
+        unordered_match,
+        int(matches == reference_length),
+        int(matches == route_length),
+        matches / route_length if route else 0.0,
+        matches / reference_length if reference_route else 0.0,
+        int(route_set == reference_set),
+        int(reference_set <= route_set),
+        int(route_set <= reference_set),
+        matches_dedup / len(route_set) if route_set else 0.0,
+        matches_dedup / len(reference_set) if reference_set else 0.0,
+    )
+    step_stats = (
+        tuple((step, 1, 0, 0) for step in common_steps)
+        + tuple((step, 0, 1, 0) for step in route_set - reference_set)
+        + tuple((step, 0, 0, 1) for step in reference_set - route_set)
+    )
+    return metrics, step_stats
+
+
+class RoutingAccuracyEvaluator:
+    """
+    A class to evaluate the routing accuracy of a given route against a reference route.
+    This class provides methods to evaluate various metrics such as ordered match,
+    unordered match, superset match, subset match, precision, recall, and step stats.
+    """
+
+    def __init__(self, step_types_to_evaluate: list = None):
         """
-        Calculate the recall of the deduplicated route against the
-        deduplicated reference route. Recall = |intersection| / |reference_set|.
-        Returns 1.0 if both sets are empty, 0.0 if only reference_set is empty.
+        Initialize the evaluator with optional step types to evaluate.
+        If step_types_to_evaluate is provided, only those steps will be evaluated,
+        otherwise only "agent" steps are.
         """
-        route_set = set(route)
-        reference_set = set(reference_route)
-        if not reference_set:
-            if not route_set:
-                return 1.0
-            return 0.0
-        matches = len(route_set & reference_set)
-        return round(matches / len(reference_set), 2)
-
-    def _step_stats(self, route: List[str], reference_route: List[str]) -> dict:
+        if step_types_to_evaluate is None:
+            step_types_to_evaluate = ["agent"]
+        # A set makes the per-step membership test constant time.
+        self._step_types_to_evaluate = frozenset(step_types_to_evaluate)
+
+    def _route_names(self, route: list) -> List[str]:
         """
-        Calculate true positives (tp), false positives (fp), and false negatives (fn)
-        for each step. Returns a dict: {step: {"tp": int, "fp": int, "fn": int}}
+        Return the names of the steps of a route that are of a type to evaluate.
+        The names are interned, as the same few agent names are hashed and
+        compared over and over by the metrics and the metrics cache; names that
+        are not strings, e.g. None in logs, are kept as they are.
         """
-        stats = {}
-        route_set = set(route)
-        reference_set = set(reference_route)
-        all_steps = route_set | reference_set
-        for step in all_steps:
-            if step in route_set and step in reference_set:
-                stats[step] = {"tp": 1, "fp": 0, "fn": 0}
-            elif step in route_set and step not in reference_set:
-                stats[step] = {"tp": 0, "fp": 1, "fn": 0}
-            elif step in reference_set and step not in route_set:
-                stats[step] = {"tp": 0, "fp": 0, "fn": 1}
-        return stats
+        step_types = self._step_types_to_evaluate
+        names = [step["name"] for step in route if step["type"] in step_types]
+        return [sys.intern(name) if isinstance(name, str) else name for name in names]
 
     def _evaluate(
         self,
@@ -210,24 +173,15 @@ class RoutingAccuracyEvaluator:
         Evaluate the chosen route against the reference route.
         Returns a dictionary of all metrics.
         """
-        return {
-            "ordered_match": self._ordered_match(route, reference_route),
-            "unordered_match": self._unordered_match(route, reference_route),
-            "superset_match": self._superset_match(route, reference_route),
-            "subset_match": self._subset_match(route, reference_route),
-            "precision": self._precision(route, reference_route),
-            "recall": self._recall(route, reference_route),
-            "unordered_match_dedup": self._unordered_match_dedup(
-                route, reference_route
-            ),
-            "superset_match_dedup": self._superset_match_dedup(route, reference_route),
-            "subset_match_dedup": self._subset_match_dedup(route, reference_route),
-            "precision_dedup": self._precision_dedup(route, reference_route),
-            "recall_dedup": self._recall_dedup(route, reference_route),
-            "step_stats": self._step_stats(route, reference_route),
-            "route_evaluated": route,
-            "reference_route_evaluated": reference_route,
+        metrics, step_stats = _compute_metrics(tuple(route), tuple(reference_route))
+        result = dict(zip(METRIC_NAMES, metrics))
+        # Each step gets its own dict, as callers may update the stats in place.
+        result["step_stats"] = {
+            step: {"tp": tp, "fp": fp, "fn": fn} for step, tp, fp, fn in step_stats
         }
+        result["route_evaluated"] = route
+        result["reference_route_evaluated"] = reference_route
+        return result
 
     def __call__(self, *, route: list, reference_route: list):
         """
@@ -239,23 +193,31 @@ class RoutingAccuracyEvaluator:
             RoutingAccuracyResult: A dictionary containing evaluation metrics.
         """
 
-        route_to_evaluate = [
-            step["name"]
-            for step in route
-            if step["type"] in self._step_types_to_evaluate
-        ]
-        reference_route_to_evaluate = [
-            step["name"]
-            for step in reference_route
-            if step["type"] in self._step_types_to_evaluate
-        ]
-
         result = self._evaluate(
-            route=route_to_evaluate,
-            reference_route=reference_route_to_evaluate,
+            route=self._route_names(route),
+            reference_route=self._route_names(reference_route),
         )
         return result
 
+    def evaluate_many(self, items: list) -> list:
+        """
+        Evaluate many routes against their reference routes. Pairs that are
+        identical once filtered by step type, which is common across a dataset,
+        are computed once by the metrics cache, but each item gets its own
+        result dict that callers may update in place.
+        Args:
+            items (list): List of (route, reference_route) tuples, see __call__.
+        Returns:
+            List[RoutingAccuracyResult]: Result of each item, in input order.
+        """
+        return [
+            self._evaluate(
+                route=self._route_names(route),
+                reference_route=self._route_names(reference_route),
+            )
+            for route, reference_route in items
+        ]
+
     def __aggregate__(self, results: List):
         """
         Aggregate precision, recall, and support for each agent from a list of
@@ -264,20 +226,19 @@ class RoutingAccuracyEvaluator:
         Returns a flat dict: {agent}_precision, {agent}_recall, {agent}_tp, etc.
         Support is defined as tp + fn (number of reference positives).
         """
+        # [tp, fp, fn] counts of each agent, in order of first appearance. A
+        # plain dict of lists is cheaper to update than Counter subscripts.
         agent_stats = {}
-        for idx, record in enumerate(results):
-            step_stats = record["step_stats"]
-            for agent, stats in step_stats.items():
-                if agent not in agent_stats:
-                    agent_stats[agent] = {"tp": 0, "fp": 0, "fn": 0}
-                agent_stats[agent]["tp"] += stats.get("tp", 0)
-                agent_stats[agent]["fp"] += stats.get("fp", 0)
-                agent_stats[agent]["fn"] += stats.get("fn", 0)
+        for record in results:
+            for agent, stats in record["step_stats"].items():
+                counts = agent_stats.get(agent)
+                if counts is None:
+                    counts = agent_stats[agent] = [0, 0, 0]
+                counts[0] += stats.get("tp", 0)
+                counts[1] += stats.get("fp", 0)
+                counts[2] += stats.get("fn", 0)
         agent_matrics = {}
-        for agent, stats in agent_stats.items():
-            tp = stats["tp"]
-            fp = stats["fp"]
-            fn = stats["fn"]
+        for agent, (tp, fp, fn) in agent_stats.items():
             support = tp + fn
             if (tp + fp) > 0:
                 precision = tp / (tp + fp)
@@ -291,16 +252,27 @@ class RoutingAccuracyEvaluator:
                 recall = 1.0
             else:
                 recall = 0.0
-            agent_matrics[f"{agent}_precision"] = round(precision, 2)
-            agent_matrics[f"{agent}_recall"] = round(recall, 2)
-            agent_matrics[f"{agent}_tp"] = tp
-            agent_matrics[f"{agent}_fp"] = fp
-            agent_matrics[f"{agent}_fn"] = fn
-            agent_matrics[f"{agent}_support"] = support
+            agent_matrics.update(
+                {
+                    f"{agent}_precision": round(precision, 2),
+                    f"{agent}_recall": round(recall, 2),
+                    f"{agent}_tp": tp,
+                    f"{agent}_fp": fp,
+                    f"{agent}_fn": fn,
+                    f"{agent}_support": support,
+                }
+            )
+            # Formatted lazily, only when the info level is enabled.
             logger.info(
-                f"Agent stats: name={agent}, "
-                f"precision={precision}, recall={recall}, "
-                f"tp={tp}, fp={fp}, fn={fn}, support={support}"
+                "Agent stats: name=%s, precision=%s, recall=%s, "
+                "tp=%s, fp=%s, fn=%s, support=%s",
+                agent,
+                precision,
+                recall,
+                tp,
+                fp,
+                fn,
+                support,
             )
 
         return agent_matrics
@@ -0,0 +1,59 @@
+# Shared Azure clients for the utility scripts. The clients are created once per
+# process and reused, so that scripts do not probe the credential chain and
+# connect to the Foundry Hub project more than once.
+
+import os
+from functools import lru_cache
+
+from azure.ai.ml import MLClient
+from azure.identity import DefaultAzureCredential
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@lru_cache(maxsize=1)
+def get_credential() -> DefaultAzureCredential:
+    """
+    Get the Azure credential shared by all clients.
+
+    The credential sources that are not used to run these scripts are excluded,
+    so that they are not probed before the Azure CLI or managed identity ones.
+
+    Returns:
+        DefaultAzureCredential: The shared credential.
+    """
+    return DefaultAzureCredential(
+        exclude_shared_token_cache_credential=True,
+        exclude_visual_studio_code_credential=True,
+        exclude_powershell_credential=True,
+        exclude_developer_cli_credential=True,
+    )
+
+
+@lru_cache(maxsize=8)
+def get_ml_client(
+    subscription_id: str = None,
+    resource_group: str = None,
+    workspace_name: str = None,
+) -> MLClient:
+    """
+    Get an MLClient linked to a Foundry Hub project.
+
+    Args:
+        subscription_id (str, optional): Azure subscription ID, defaults to the
+        AZURE_SUBSCRIPTION_ID environment variable.
+        resource_group (str, optional): Resource group of the project, defaults
+        to the AZURE_RESOURCE_GROUP environment variable.
+        workspace_name (str, optional): Name of the hub project, defaults to the
+        AZURE_HUB_PROJECT_NAME environment variable.
+
+    Returns:
+        MLClient: The client of the project.
+    """
+    return MLClient(
+        subscription_id=subscription_id or os.environ["AZURE_SUBSCRIPTION_ID"],
+        resource_group_name=resource_group or os.environ["AZURE_RESOURCE_GROUP"],
+        workspace_name=workspace_name or os.environ["AZURE_HUB_PROJECT_NAME"],
+        credential=get_credential(),
+    )
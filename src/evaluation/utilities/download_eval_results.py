@@ -1,26 +1,27 @@
 import argparse
 import json
 import os
-import mlflow
+from functools import lru_cache
 
-from azure.ai.ml import MLClient
-from azure.identity import DefaultAzureCredential
+import mlflow
+import orjson
+from azure_clients import get_ml_client
 from dotenv import load_dotenv
-from storage_account_io import read_blob_from_uri
+from storage_account_io import read_blob_lines_from_uri
 
 load_dotenv()
 
 
+@lru_cache(maxsize=1)
+def _get_workspace():
+    """Get the AI Hub project workspace, fetched once per process."""
+    return get_ml_client().workspaces.get(name=os.environ["AZURE_HUB_PROJECT_NAME"])
+
+
 def get_workspace_specs():
     """Get workspace specifications."""
 
-    ml_client = MLClient(
-        subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
-        resource_group_name=os.environ["AZURE_RESOURCE_GROUP"],
-        workspace_name=os.environ["AZURE_HUB_PROJECT_NAME"],
-        credential=DefaultAzureCredential(),
-    )
-    workspace = ml_client.workspaces.get(name=os.environ["AZURE_HUB_PROJECT_NAME"])
+    workspace = _get_workspace()
     project_id = workspace._workspace_id
     storage_id = workspace.storage_account
     storage_account_name = storage_id.split("/")[-1] if storage_id else None
@@ -53,26 +54,19 @@ def get_evaluation_results(evaluation_job_id: str) -> list:
         data_container_id = f"dcid.{job_id}"
         results_uri = f"https://{storage_account_name}.blob.core.windows.net/{workspace_id}-azureml/ExperimentRun/{data_container_id}/instance_results.jsonl"  # noqa: E501
 
-        # Read the blob content
-        content = read_blob_from_uri(results_uri)
-
-        if content:
-            # Parse JSONL content
-            lines = content.strip().split("\n")
-            results = []
+        # Parse the JSONL content line by line as the blob is downloaded
+        results = []
 
-            for line in lines:
-                if line.strip():
-                    try:
-                        results.append(json.loads(line))
-                    except json.JSONDecodeError as e:
-                        print(f"Error parsing line: {e}")
-                        continue
+        for line in read_blob_lines_from_uri(results_uri):
+            if line.strip():
+                try:
+                    results.append(orjson.loads(line))
+                except orjson.JSONDecodeError as e:
+                    print(f"Error parsing line: {e}")
+                    continue
 
-            print(f"Parsed {len(results)} JSON objects")
-            return results
-        else:
-            print("Failed to read blob content")
+        print(f"Parsed {len(results)} JSON objects")
+        return results
 
     except Exception as e:
         print(f"Error processing evaluation response: {e}")
@@ -90,15 +84,8 @@ def get_evaluation_metrics(evaluation_job_id: str) -> dict:
         dict: JSON content of the evaluation metrics.
     """
     try:
-        ml_client = MLClient(
-            subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
-            resource_group_name=os.environ["AZURE_RESOURCE_GROUP"],
-            workspace_name=os.environ["AZURE_HUB_PROJECT_NAME"],
-            credential=DefaultAzureCredential(),
-        )
-
         # Get the MLflow tracking URI from the workspace
-        workspace = ml_client.workspaces.get(os.environ["AZURE_HUB_PROJECT_NAME"])
+        workspace = _get_workspace()
         mlflow.set_tracking_uri(workspace.mlflow_tracking_uri)
 
         # Get metrics from the MLflow run
@@ -116,6 +103,51 @@ def get_evaluation_metrics(evaluation_job_id: str) -> dict:
         return None
 
 
+def get_evaluation_metrics_bulk(evaluation_job_ids: list) -> dict:
+    """
+    Get evaluation metrics of several AI Hub Project evaluation runs, fetched
+    with a single MLflow search rather than one request per run. A single run is
+    read directly, which is faster than searching all experiments for it.
+
+    Args:
+        evaluation_job_ids (list): The evaluation job IDs which are available in
+        the evaluation job creation responses.
+
+    Returns:
+        dict: JSON content of the evaluation metrics of each job, by job ID.
+    """
+    metrics = {}
+    if len(evaluation_job_ids) == 1:
+        job_id = evaluation_job_ids[0]
+        job_metrics = get_evaluation_metrics(job_id)
+        return {job_id: job_metrics} if job_metrics else {}
+
+    try:
+        # Get the MLflow tracking URI from the workspace
+        workspace = _get_workspace()
+        mlflow.set_tracking_uri(workspace.mlflow_tracking_uri)
+
+        # Get metrics from all the MLflow runs at once
+        quoted_ids = ", ".join(f"'{job_id}'" for job_id in evaluation_job_ids)
+        runs = mlflow.search_runs(
+            filter_string=f"attributes.run_id IN ({quoted_ids})",
+            search_all_experiments=True,
+            output_format="list",
+        )
+        metrics = {run.info.run_id: run.data.metrics for run in runs}
+    except Exception as e:
+        print(f"Error searching jobs {evaluation_job_ids}: {e}")
+
+    # Jobs the search did not return are retrieved one by one.
+    for job_id in evaluation_job_ids:
+        if job_id not in metrics:
+            metrics[job_id] = get_evaluation_metrics(job_id)
+
+    metrics = {job_id: value for job_id, value in metrics.items() if value}
+    print(f"Metrics found for {len(metrics)} of {len(evaluation_job_ids)} jobs.")
+    return metrics
+
+
 
 def main():
     """
@@ -124,13 +156,14 @@ def main():
 
     Config structure:
         {
-            "input_path": "eval_run.json",  # Path to input JSON with 'job_id'
+            "input_path": "eval_run.json",  # Path to input JSON with 'job_id' or 'job_ids'
             "results_output_path": "evaluation_results.json",  # Path to save output JSON for evaluation results
             "metrics_output_path": "evaluation_metrics.json",  # Path to save output JSON for evaluation metrics
             "notes": (
                 "Paths are relative to the parent directory of "
                 "download_eval_results.py. Input JSON should contain a 'job_id' key "
-                "with the evaluation run ID."
+                "with the evaluation run ID, or a 'job_ids' key with a list of "
+                "evaluation run IDs, in which case the outputs are keyed by job ID."
             )
         }
     """
@@ -152,11 +185,22 @@ def main():
     with open(input_path, "r") as f:
         evaluation_response = json.load(f)
 
-    # Read the evaluation job ID from the provided file
-    evaluation_job_id = evaluation_response.get("job_id")
-
-    if evaluation_job_id:
-        results = get_evaluation_results(evaluation_job_id)
+    # Read the evaluation job IDs from the provided file
+    evaluation_job_ids = evaluation_response.get("job_ids")
+    # Outputs are saved by job ID when 'job_ids' is given, and as is for the
+    # single 'job_id' input.
+    single_job = evaluation_job_ids is None
+    if single_job and evaluation_response.get("job_id"):
+        evaluation_job_ids = [evaluation_response["job_id"]]
+
+    if evaluation_job_ids:
+        results = {}
+        for job_id in evaluation_job_ids:
+            job_results = get_evaluation_results(job_id)
+            if job_results:
+                results[job_id] = job_results
+        if single_job:
+            results = results.get(evaluation_job_ids[0])
         if results:
             print("Evaluation results retrieved successfully.")
             with open(results_output_path, "w") as f:
@@ -165,7 +209,9 @@ def main():
         else:
             print("No results found or an error occurred.")
 
-        metrics = get_evaluation_metrics(evaluation_job_id)
+        metrics = get_evaluation_metrics_bulk(evaluation_job_ids)
+        if single_job:
+            metrics = metrics.get(evaluation_job_ids[0])
         if metrics:
             print("Evaluation metrics retrieved successfully.")
             with open(metrics_output_path, "w") as f:
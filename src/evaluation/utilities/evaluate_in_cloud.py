@@ -1,17 +1,22 @@
 import argparse
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 from azure.ai.evaluation import AzureOpenAIModelConfiguration
-from azure.ai.ml import MLClient
 from azure.ai.projects import AIProjectClient
 from azure.ai.projects.models import Dataset, Evaluation, EvaluatorConfiguration
-from azure.identity import DefaultAzureCredential
+from azure_clients import get_credential, get_ml_client
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Maximum number of evaluator models looked up at the same time.
+MAX_MODEL_LOOKUP_WORKERS = 8
 
+
+@lru_cache(maxsize=4)
 def get_hub_project_client(
     project_endpoint: str = None,
 ) -> AIProjectClient:
@@ -22,7 +27,8 @@ def get_hub_project_client(
         project_endpoint (str, optional): The endpoint of the Azure AI Foundry project.
 
     Returns:
-        AIProjectClient: An instance of AIProjectClient.
+        AIProjectClient: An instance of AIProjectClient, shared by the calls with
+        the same project endpoint.
     """
     if project_endpoint is None:
         project_endpoint = os.environ.get("HUB_PROJECT_ENDPOINT")
@@ -30,7 +36,7 @@ def get_hub_project_client(
             raise ValueError("HUB_PROJECT_ENDPOINT environment variable is not set.")
 
     return AIProjectClient.from_connection_string(
-        credential=DefaultAzureCredential(),
+        credential=get_credential(),
         conn_str=project_endpoint,
     )
 
@@ -52,6 +58,17 @@ def get_data_id(ml_client, data_name, data_version):
         )
 
 
+@lru_cache(maxsize=128)
+def _get_model(ml_client, name, version):
+    """
+    Get an evaluator model, by label if version is "latest". The lookups are
+    cached, so that evaluators referring to the same model look it up once.
+    """
+    if version == "latest":
+        return ml_client.models.get(name=name, label="latest")
+    return ml_client.models.get(name=name, version=version)
+
+
 def configure_evaluator(ml_client, workspace, evaluators_config):
     """
     Configure evaluator settings for the evaluation job.
@@ -71,21 +88,34 @@ def configure_evaluator(ml_client, workspace, evaluators_config):
         "api_version": os.environ["AZURE_OPENAI_API_VERSION"],
     }
     init_params = {"model_config": model_config}
+
+    # Look up the distinct evaluator models concurrently, the loop below then
+    # reads them from the cache.
+    model_keys = {
+        (evaluator["name"], evaluator.get("version", "latest"))
+        for evaluator in evaluators_config
+        if evaluator.get("name")
+    }
+    with ThreadPoolExecutor(
+        max_workers=min(MAX_MODEL_LOOKUP_WORKERS, len(model_keys) or 1)
+    ) as executor:
+        list(executor.map(lambda key: _get_model(ml_client, *key), model_keys))
+
+    # Evaluators are referred to by their model ID within the workspace.
+    models_prefix = (
+        f"azureml://locations/{workspace.location}/workspaces/"
+        f"{workspace._workspace_id}/models"
+    )
     for evaluator in evaluators_config:
         evaluator_name = evaluator.get("name")
         if not evaluator_name:
             raise ValueError("Evaluator name is required in the configuration.")
 
         evaluator_version = evaluator.get("version", "latest")
-        if evaluator_version == "latest":
-            evaluator_model = ml_client.models.get(name=evaluator_name, label="latest")
-        else:
-            evaluator_model = ml_client.models.get(
-                name=evaluator_name, version=evaluator_version
-            )
+        evaluator_model = _get_model(ml_client, evaluator_name, evaluator_version)
         data_mapping = {
             key: f"${{data.{value}}}"
-            for key, value in evaluator.get("data_mapping", {}).items()
+            for key, value in (evaluator.get("data_mapping") or {}).items()
         }
         if not data_mapping:
             raise ValueError(
@@ -101,9 +131,7 @@ def configure_evaluator(ml_client, workspace, evaluators_config):
                 )
         config_kwargs = {
             "id": (
-                f"azureml://locations/{workspace.location}/workspaces/"
-                f"{workspace._workspace_id}/models/{evaluator_name}/versions/"
-                f"{evaluator_model.version}"
+                f"{models_prefix}/{evaluator_name}/versions/{evaluator_model.version}"
             ),
             "data_mapping": data_mapping,
         }
@@ -191,12 +219,7 @@ def main():
     # An ML client is linked to the specified Foundry hub project and
     # provides the access to the underlying data and evaluators (i.e., models)
     # that underpin the Foundry evaluation job.
-    ml_client = MLClient(
-        subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
-        resource_group_name=os.environ["AZURE_RESOURCE_GROUP"],
-        workspace_name=os.environ["AZURE_HUB_PROJECT_NAME"],
-        credential=DefaultAzureCredential(),
-    )
+    ml_client = get_ml_client()
     workspace = ml_client.workspaces.get(name=os.environ["AZURE_HUB_PROJECT_NAME"])
 
     # Retrieve the data asset ID
@@ -2,13 +2,11 @@
 
 import argparse
 import json
-import os
 from pathlib import Path
 
-from azure.ai.ml import MLClient
 from azure.ai.ml.constants import AssetTypes
 from azure.ai.ml.entities import Data
-from azure.identity import DefaultAzureCredential
+from azure_clients import get_ml_client
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -57,12 +55,7 @@ def main():
         print("Registration cancelled by user.")
         return
 
-    ml_client = MLClient(
-        subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
-        resource_group_name=os.environ["AZURE_RESOURCE_GROUP"],
-        workspace_name=os.environ["AZURE_HUB_PROJECT_NAME"],
-        credential=DefaultAzureCredential(),
-    )
+    ml_client = get_ml_client()
 
     try:
         # Increment the version if the data asset already exists
@@ -5,74 +5,125 @@
 import argparse
 import importlib.util
 import json
-import os
 import shutil
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
 from pathlib import Path
 
-from azure.ai.ml import MLClient
 from azure.ai.ml.entities import Model
-from azure.identity import DefaultAzureCredential
+from azure_clients import get_ml_client
 from dotenv import load_dotenv
 from promptflow.client import PFClient
 
 load_dotenv()
 
+# Maximum number of evaluators uploaded to Foundry at the same time.
+MAX_UPLOAD_WORKERS = 8
 
-def register_evaluator(evaluator_cfg, module_name):
+
+def upload_flow(local_path, evaluator_name, description):
     """
-    Register a single evaluator based on the configuration.
-    Handles dynamic import, flow saving, and evaluator registration
-    within a Foundry Hub project.
+    Upload a saved evaluator flow to Foundry as an evaluator.
+
+    Args:
+        local_path (Path): Directory of the saved flow.
+        evaluator_name (str): Name of the evaluator in Foundry.
+        description (str): Description of the evaluator in Foundry.
+    """
+    ml_client = get_ml_client()
+    custom_evaluator = Model(
+        path=local_path,
+        name=evaluator_name,
+        description=description,
+    )
+    result = ml_client.evaluators.create_or_update(custom_evaluator)
+    print(f"Registered evaluator for {evaluator_name}: " f"{result.id}")
+
+
+@lru_cache(maxsize=32)
+def _load_module(evaluator_path, module_name):
+    """
+    Import an evaluator definition script as a module. The modules are cached
+    by path and module name, so that a script listed for several evaluators is
+    only executed once.
+    """
+    # Add the script's directory to sys.path to support local imports
+    script_dir = str(Path(evaluator_path).parent)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    spec = importlib.util.spec_from_file_location(module_name, evaluator_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, "__file__"):
+        module.__file__ = evaluator_path
+    return module
+
+
+def describe_flow_location(evaluator_cfg):
+    """
+    Describe where the flow of an evaluator is saved, for the registration plan.
+    """
+    if not evaluator_cfg.get("keep_flow", False):
+        return "temporary directory"
+    flow_path = evaluator_cfg.get("flow_path", "<evaluator name>_flow")
+    if evaluator_cfg.get("overwrite", False):
+        return f"{flow_path} (overwritten if it exists)"
+    return f"{flow_path} (skipped if it exists)"
+
+
+def prepare_evaluator(evaluator_cfg, module_name, exit_stack):
+    """
+    Import an evaluator based on the configuration and save it as a flow, ready
+    to be uploaded with upload_flow.
+
+    Args:
+        evaluator_cfg (dict): Configuration of the evaluator.
+        module_name (str): Module name to import the evaluator script as.
+        exit_stack (ExitStack): Stack the temporary directory of the flow is
+        entered into, so that it is removed when the stack is closed.
+    Returns:
+        tuple: The arguments of upload_flow, or None if the flow directory
+        already exists and is not to be overwritten.
     """
 
     # Path to the evaluator definition script
     # This path is relative to the current file's directory.
     evaluator_path = (Path(__file__).parent / evaluator_cfg["path"]).resolve()
-    # Add the script's directory to sys.path to support local imports
-    script_dir = evaluator_path.parent
-    if str(script_dir) not in sys.path:
-        sys.path.insert(0, str(script_dir))
 
     # Load the class dynamically and register it in sys.modules
     # This allows the class to be imported as if it were a regular module.
-    spec = importlib.util.spec_from_file_location(module_name, str(evaluator_path))
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    # The module is registered again for each evaluator, as evaluators from
+    # other scripts may have been registered under the same name in between.
+    module = _load_module(str(evaluator_path), module_name)
     sys.modules[module_name] = module
-    if not hasattr(module, "__file__"):
-        module.__file__ = str(evaluator_path)
     evaluator_name = getattr(module, "EVALUATOR_NAME")
     evaluator_description = getattr(module, "EVALUATOR_DESCRIPTION", "")
     EvaluatorClass = getattr(module, evaluator_name)
     EvaluatorClass.__module__ = module_name
 
-    # Ask user for the flow save location
-    default_local_path = Path(__file__).parent / f"{evaluator_name}_flow"
-    user_input = input(
-        f"Enter path to save the flow for {evaluator_name} "
-        f"[default: {default_local_path}]: "
-    ).strip()
-    local_path = Path(user_input) if user_input else default_local_path
-
-    # Confirm with user before saving
-    confirm_save = input(f"Save flow to {local_path}? (y/n): ").strip().lower()
-    if confirm_save != "y":
-        print(f"Skipping registration for {evaluator_name}.")
-        return
-
-    # If the folder exists, confirm overwrite
-    if local_path.exists():
-        overwrite = (
-            input(f"Path {local_path} already exists. Overwrite? (y/n): ")
-            .strip()
-            .lower()
+    if evaluator_cfg.get("keep_flow", False):
+        # The flow path is relative to the current file's directory.
+        local_path = Path(__file__).parent / evaluator_cfg.get(
+            "flow_path", f"{evaluator_name}_flow"
         )
-        if overwrite == "y":
+        if local_path.exists():
+            if not evaluator_cfg.get("overwrite", False):
+                print(
+                    f"Path {local_path} already exists, skipping registration "
+                    f"for {evaluator_name}."
+                )
+                return None
             shutil.rmtree(local_path)
-        else:
-            print("Skipping registration for this evaluator.")
-            return
+    else:
+        # The temporary directory is removed once, when the stack is closed.
+        tmp = exit_stack.enter_context(
+            tempfile.TemporaryDirectory(prefix=f"{evaluator_name}_flow_")
+        )
+        local_path = Path(tmp) / f"{evaluator_name}_flow"
 
     # Save the flow locally.
     pf_client = PFClient()
@@ -80,33 +131,23 @@ def register_evaluator(evaluator_cfg, module_name):
         entry=EvaluatorClass,
         path=local_path,
     )
+    return local_path, evaluator_name, evaluator_description
 
-    # Upload the flow to Foundry.
-    ml_client = MLClient(
-        subscription_id=os.environ["AZURE_SUBSCRIPTION_ID"],
-        resource_group_name=os.environ["AZURE_RESOURCE_GROUP"],
-        workspace_name=os.environ["AZURE_HUB_PROJECT_NAME"],
-        credential=DefaultAzureCredential(),
-    )
-    custom_evaluator = Model(
-        path=local_path,
-        name=evaluator_name,
-        description=evaluator_description,
-    )
-    result = ml_client.evaluators.create_or_update(custom_evaluator)
-    print(f"Registered evaluator for {evaluator_name}: " f"{result.id}")
 
-    # Optionally, clean up the local flow directory
-    # Ask user if they want to delete the local flow directory
-    delete_local = (
-        input(f"Do you want to delete the local flow directory {local_path}? (y/n): ")
-        .strip()
-        .lower()
-    )
-    if delete_local == "y":
-        print(f"Deleting local flow directory: {local_path}")
-        if Path(local_path).exists():
-            shutil.rmtree(local_path)
+def register_evaluator(evaluator_cfg, module_name):
+    """
+    Register a single evaluator based on the configuration.
+    Handles dynamic import, flow saving, and evaluator registration
+    within a Foundry Hub project.
+
+    Args:
+        evaluator_cfg (dict): Configuration of the evaluator.
+        module_name (str): Module name to import the evaluator script as.
+    """
+    with ExitStack() as exit_stack:
+        flow = prepare_evaluator(evaluator_cfg, module_name, exit_stack)
+        if flow is not None:
+            upload_flow(*flow)
 
 
 def main():
@@ -114,18 +155,27 @@ def main():
     Example usage:
         python register_evaluator.py --config ../../../config/evaluator_registration_config.json # noqa: E501
 
+    The registration plan is printed, and the evaluators are only registered
+    when --yes is passed.
+
     Config structure:
         {
             "module_name": "custom_evaluators",
             "evaluators": [
                 {
                     "path": "../evaluators/routing_accuracy/routing_accuracy.py",
-                    "register": true
+                    "register": true,
+                    "keep_flow": false,  # Optional, keep the saved flow in flow_path
+                    "flow_path": "RoutingAccuracyEvaluator_flow",  # Optional
+                    "overwrite": false  # Optional, overwrite an existing flow_path
                 }
             ],
             "notes": (
-                "The paths to the evaluator definition scripts are relative to the "
-                "parent directory of register_evaluator.py."
+                "The paths to the evaluator definition scripts and flows are "
+                "relative to the parent directory of register_evaluator.py. "
+                "Flows are saved to temporary directories removed after the "
+                "upload unless keep_flow is true, flow_path defaults to "
+                "<evaluator name>_flow."
             )
         }
     """
@@ -136,6 +186,11 @@ def main():
         required=True,
         help="Path to evaluator_registration_config JSON file.",
     )
+    parser.add_argument(
+        "--yes",
+        action="store_true",
+        help="Register the evaluators of the plan, which is only printed otherwise.",
+    )
     args = parser.parse_args()
 
     # Load config
@@ -143,10 +198,39 @@ def main():
         config = json.load(f)
 
     module_name = config.get("module_name", "custom_evaluators")
-    for evaluator_cfg in config.get("evaluators", []):
-        if not evaluator_cfg.get("register", False):
-            continue
-        register_evaluator(evaluator_cfg, module_name)
+    evaluator_cfgs = [
+        evaluator_cfg
+        for evaluator_cfg in config.get("evaluators", [])
+        if evaluator_cfg.get("register", False)
+    ]
+
+    print("Registration plan:")
+    for evaluator_cfg in evaluator_cfgs:
+        print(
+            f"  {evaluator_cfg['path']}: flow saved to "
+            f"{describe_flow_location(evaluator_cfg)}"
+        )
+    if not args.yes:
+        print("Pass --yes to register the evaluators.")
+        return
+
+    with ExitStack() as exit_stack:
+        # Evaluators are imported and saved one at a time, as importing them
+        # changes sys.modules. The uploads do not depend on each other and run
+        # concurrently.
+        flows = []
+        for evaluator_cfg in evaluator_cfgs:
+            flow = prepare_evaluator(evaluator_cfg, module_name, exit_stack)
+            if flow is not None:
+                flows.append(flow)
+
+        if flows:
+            # Create the shared MLClient before the threads use it.
+            get_ml_client()
+            with ThreadPoolExecutor(
+                max_workers=min(MAX_UPLOAD_WORKERS, len(flows))
+            ) as executor:
+                list(executor.map(lambda flow: upload_flow(*flow), flows))
 
 
 if __name__ == "__main__":
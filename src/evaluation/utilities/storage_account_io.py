@@ -1,43 +1,73 @@
-from azure.identity import DefaultAzureCredential
+import codecs
+from functools import lru_cache
+
 from azure.storage.blob import BlobServiceClient
+from azure_clients import get_credential
+
+
+@lru_cache(maxsize=16)
+def _get_blob_service_client(storage_account_name, credential):
+    """
+    Get the blob service client of a storage account, created once per account
+    and credential so that its connection pool and tokens are reused.
+    """
+    return BlobServiceClient(
+        account_url=f"https://{storage_account_name}.blob.core.windows.net",
+        credential=credential,
+    )
+
+
+def _get_blob_client(blob_uri, credential=None):
+    """
+    Get the blob client of a blob from its full URI.
+
+    Args:
+        blob_uri: Full blob URI
+        (e.g., https://account.blob.core.windows.net/container/path/file.json)
+        credential: Optional Azure credential, defaults to the shared credential
+        of the utility scripts
+
+    Returns:
+        BlobClient of the blob
+    """
+    # Parse the URI to extract components
+    if not blob_uri.startswith("https://"):
+        raise ValueError("URI must start with https://")
+
+    # Remove protocol and split
+    uri_parts = blob_uri.replace("https://", "").split("/")
+    storage_account_name = uri_parts[0].split(".")[0]
+    container_name = uri_parts[1]
+    blob_path = "/".join(uri_parts[2:])
+
+    print(f"Storage Account: {storage_account_name}")
+    print(f"Container: {container_name}")
+    print(f"Blob Path: {blob_path}")
+
+    # Get blob service client with credential
+    blob_service_client = _get_blob_service_client(
+        storage_account_name, credential or get_credential()
+    )
+
+    # Get blob client
+    return blob_service_client.get_blob_client(container=container_name, blob=blob_path)
 
 
-def read_blob_from_uri(blob_uri):
+def read_blob_from_uri(blob_uri, credential=None):
     """
     Read a file from Azure blob storage using full URI
 
     Args:
         blob_uri: Full blob URI
         (e.g., https://account.blob.core.windows.net/container/path/file.json)
+        credential: Optional Azure credential, defaults to the shared credential
+        of the utility scripts
 
     Returns:
         File content as string
     """
     try:
-        # Parse the URI to extract components
-        if not blob_uri.startswith("https://"):
-            raise ValueError("URI must start with https://")
-
-        # Remove protocol and split
-        uri_parts = blob_uri.replace("https://", "").split("/")
-        storage_account_name = uri_parts[0].split(".")[0]
-        container_name = uri_parts[1]
-        blob_path = "/".join(uri_parts[2:])
-
-        print(f"Storage Account: {storage_account_name}")
-        print(f"Container: {container_name}")
-        print(f"Blob Path: {blob_path}")
-
-        # Create blob service client with credential
-        blob_service_client = BlobServiceClient(
-            account_url=f"https://{storage_account_name}.blob.core.windows.net",
-            credential=DefaultAzureCredential(),
-        )
-
-        # Get blob client
-        blob_client = blob_service_client.get_blob_client(
-            container=container_name, blob=blob_path
-        )
+        blob_client = _get_blob_client(blob_uri, credential)
 
         # Download content
         content = blob_client.download_blob().readall().decode("utf-8")
@@ -48,3 +78,58 @@ def read_blob_from_uri(blob_uri):
     except Exception as e:
         print(f"Error reading blob from URI: {e}")
         return None
+
+
+def read_blob_from_uri_stream(blob_uri, credential=None):
+    """
+    Read a file from Azure blob storage using full URI, chunk by chunk, so that
+    the content can be processed as it is downloaded without holding all of it
+    in memory. Unlike read_blob_from_uri, errors are raised to the caller.
+
+    Args:
+        blob_uri: Full blob URI
+        (e.g., https://account.blob.core.windows.net/container/path/file.json)
+        credential: Optional Azure credential, defaults to the shared credential
+        of the utility scripts
+
+    Yields:
+        File content as string chunks
+    """
+    blob_client = _get_blob_client(blob_uri, credential)
+
+    # A character may be split across two chunks, the incremental decoder
+    # keeps its first bytes until the next chunk arrives.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in blob_client.download_blob().chunks():
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def read_blob_lines_from_uri(blob_uri, credential=None):
+    """
+    Read a text file from Azure blob storage using full URI, line by line, see
+    read_blob_from_uri_stream.
+
+    Args:
+        blob_uri: Full blob URI
+        (e.g., https://account.blob.core.windows.net/container/path/file.json)
+        credential: Optional Azure credential, defaults to the shared credential
+        of the utility scripts
+
+    Yields:
+        Lines of the file, without the newline
+    """
+    # Split on newlines only, as str.splitlines also splits on characters such
+    # as U+2028 that JSON strings may hold unescaped.
+    pending = ""
+    for text in read_blob_from_uri_stream(blob_uri, credential):
+        lines = (pending + text).split("\n")
+        # The last line may continue in the next chunk.
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
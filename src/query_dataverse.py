@@ -1,120 +1,392 @@
-import json
+import argparse
+import atexit
 import os
+from email import message_from_bytes
+from email.message import Message
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+from uuid import uuid4
 
-from dataverse_api import DataverseClient
+import orjson
 from dotenv import load_dotenv
-from msal import ConfidentialClientApplication
+from msal import ConfidentialClientApplication, SerializableTokenCache
 from msal_requests_auth.auth import ClientCredentialAuth
-from requests import Session
+from requests import HTTPError, Session
 
 load_dotenv()
 
-# Authenticate
-app_reg = ConfidentialClientApplication(
-    client_id=os.getenv("CLIENT_ID"),
-    client_credential=os.getenv("CLIENT_SECRET"),
-    authority=os.getenv("TOKEN_AUTHORITY_ENDPOINT"),
-)
-environment_url = os.getenv("ENVIRONMENT_URL")
+DATAVERSE_API_PATH = "/api/data/v9.2/"
+ODATA_HEADERS = {
+    "Accept": "application/json",
+    "OData-MaxVersion": "4.0",
+    "OData-Version": "4.0",
+}
+# Maximum number of conversation transcripts read by Example 2, as transcripts
+# hold the whole conversation log.
+TRANSCRIPT_LIMIT = int(os.getenv("TRANSCRIPT_LIMIT", "10"))
+# MSAL token cache kept across runs, so that runs within the token lifetime do
+# not request a new token.
+TOKEN_CACHE_PATH = Path.home() / ".cache" / "eval-workbook" / "msal.bin"
 
-auth = ClientCredentialAuth(client=app_reg, scopes=[environment_url + "/.default"])
 
-# Prepare Session
-session = Session()
-session.auth = auth
+def query_url(entity_set: str, select: list, filter: str, top: int = None) -> str:
+    """
+    Build the URL of a query on a Dataverse entity set, relative to the Web API.
 
-# Instantiate DataverseClient
-client = DataverseClient(session=session, environment_url=environment_url)
+    Args:
+        entity_set (str): Entity set name of the table, e.g. "botcomponents".
+        select (list): Columns to return.
+        filter (str): OData filter of the rows to return.
+        top (int, optional): Maximum number of rows to return, all by default.
+    Returns:
+        str: The relative query URL.
+    """
+    url = f"{entity_set}?$select={','.join(select)}&$filter={quote(filter)}"
+    if top is not None:
+        url += f"&$top={top}"
+    return url
 
-# --------------------------------------------------------------------------
-# Example 1a: Read bot component (e.g. agent) description and specification
-# --------------------------------------------------------------------------
 
-# Instantiate interface to the entity
+def read_all_pages(session: Session, data: dict) -> list:
+    """
+    Read the records of a query result, following @odata.nextLink to the next
+    pages when the result holds more records than the server page size.
+
+    Args:
+        session (Session): Authenticated session to the Dataverse environment.
+        data (dict): The decoded first page of the query result.
+    Returns:
+        list: The records of all pages.
+    """
+    records = data["value"]
+    next_link = data.get("@odata.nextLink")
+    while next_link:
+        response = session.get(next_link, headers=ODATA_HEADERS)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        records.extend(data["value"])
+        next_link = data.get("@odata.nextLink")
+    return records
+
+
+def dataverse_get(session: Session, environment_url: str, url: str) -> list:
+    """
+    Run a single Dataverse Web API query with a plain GET request.
+
+    Args:
+        session (Session): Authenticated session to the Dataverse environment.
+        environment_url (str): URL of the Dataverse environment.
+        url (str): Query URL relative to the Web API, see query_url.
+    Returns:
+        list: The records returned by the query.
+    """
+    api_url = environment_url.rstrip("/") + DATAVERSE_API_PATH
+    response = session.get(api_url + url, headers=ODATA_HEADERS)
+    response.raise_for_status()
+    return read_all_pages(session, orjson.loads(response.content))
+
+
+def _batch_responses(message: Message):
+    """
+    Iterate over the HTTP responses held by the parts of a $batch response,
+    including the parts of nested change sets.
+
+    Args:
+        message (Message): The parsed multipart response.
+    Yields:
+        tuple: The status code, status line and body of each response.
+    """
+    for part in message.get_payload():
+        if part.is_multipart():
+            yield from _batch_responses(part)
+            continue
+        status_line, _, http_response = part.get_payload(decode=True).partition(b"\n")
+        status_line = status_line.decode("utf-8").strip()
+        # The headers and body of the response parse like a message of their own.
+        body = message_from_bytes(http_response).get_payload(decode=True)
+        yield int(status_line.split()[1]), status_line, body
+
+
+def dataverse_batch(session: Session, environment_url: str, urls: list) -> list:
+    """
+    Run several Dataverse Web API queries in a single $batch request, i.e. in a
+    single round trip instead of one per query:
+    https://learn.microsoft.com/en-us/power-apps/developer/data-platform/webapi/execute-batch-operations-using-web-api
+    Args:
+        session (Session): Authenticated session to the Dataverse environment.
+        environment_url (str): URL of the Dataverse environment.
+        urls (list): Query URLs relative to the Web API, see query_url.
+    Returns:
+        list: The records returned by each query, in the order of the urls.
+    """
+    if len(urls) == 1:
+        # A batch of one query only adds the multipart overhead.
+        return [dataverse_get(session, environment_url, urls[0])]
+
+    api_url = environment_url.rstrip("/") + DATAVERSE_API_PATH
+    boundary = f"batch_{uuid4()}"
+    body = "".join(
+        f"--{boundary}\r\n"
+        "Content-Type: application/http\r\n"
+        "Content-Transfer-Encoding: binary\r\n\r\n"
+        f"GET {api_url}{url} HTTP/1.1\r\n"
+        "Accept: application/json\r\n\r\n"
+        for url in urls
+    )
+    body += f"--{boundary}--\r\n"
+    response = session.post(
+        api_url + "$batch",
+        data=body.encode("utf-8"),
+        headers={
+            **ODATA_HEADERS,
+            "Content-Type": f"multipart/mixed; boundary={boundary}",
+        },
+    )
+    response.raise_for_status()
+
+    # Each part of the multipart response holds the HTTP response of a query.
+    message = message_from_bytes(
+        f"Content-Type: {response.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        + response.content
+    )
+    if not message.is_multipart():
+        raise HTTPError(f"Unexpected batch response: {response.text[:500]}")
+    results = []
+    for status, status_line, http_body in _batch_responses(message):
+        if not 200 <= status < 300:
+            raise HTTPError(f"Batch query failed with {status_line}: {http_body!r}")
+        results.append(read_all_pages(session, orjson.loads(http_body)))
+    if len(results) != len(urls):
+        raise HTTPError(
+            f"Batch returned {len(results)} responses for {len(urls)} queries."
+        )
+    return results
+
+
+def load_token_cache() -> SerializableTokenCache:
+    """
+    Load the MSAL token cache from TOKEN_CACHE_PATH, and save it back there at
+    exit if tokens were added or refreshed. The file is only readable by the user.
+
+    Returns:
+        SerializableTokenCache: The token cache.
+    """
+    cache = SerializableTokenCache()
+    if TOKEN_CACHE_PATH.exists():
+        cache.deserialize(TOKEN_CACHE_PATH.read_text())
+
+    def save_token_cache():
+        if cache.has_state_changed:
+            TOKEN_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(TOKEN_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(cache.serialize())
+            os.chmod(TOKEN_CACHE_PATH, 0o600)
+
+    atexit.register(save_token_cache)
+    return cache
+
+
+@lru_cache(maxsize=1)
+def get_session() -> Session:
+    """
+    Get the session authenticated to the Dataverse environment, shared by all
+    examples so that MSAL and its token cache are set up once per process.
+
+    Returns:
+        Session: The authenticated session.
+    """
+    app_reg = ConfidentialClientApplication(
+        client_id=os.getenv("CLIENT_ID"),
+        client_credential=os.getenv("CLIENT_SECRET"),
+        authority=os.getenv("TOKEN_AUTHORITY_ENDPOINT"),
+        token_cache=load_token_cache(),
+    )
+    auth = ClientCredentialAuth(
+        client=app_reg, scopes=[os.getenv("ENVIRONMENT_URL") + "/.default"]
+    )
+    session = Session()
+    session.auth = auth
+    return session
+
+
+# Tables are referred to by entity set name:
 # https://learn.microsoft.com/en-us/power-apps/developer/data-platform/webapi/reference/bot_botcomponent
-entity = client.entity(logical_name="botcomponent")
-
-# Read data from the entity
-data = entity.read(
-    select=["name", "description", "data"],
-    filter=f"botcomponentid eq '{os.getenv("BOT_COMPONENT_ID")}'",
-)[0]
-
-print("\n------------------------- Bot Component -------------------------")
-print(f"\nName: {data['name']}")
-print(f"\nDescription: {data['description']}")
-print(f"\nSpecification: {data['data'][:1500]}\n...")
-
-
-# --------------------------------------------------------------------------
-# Example 1b: Read descriptions and specifications of a principal agent
-# and its sub-agents
-# --------------------------------------------------------------------------
-
-# Read principal agent id
-principal_agent_name = os.getenv("PRINCIPAL_AGENT_NAME")
-entity = client.entity(logical_name="bot")
-data = entity.read(
-    select=["name", "botid"],
-    filter=f"name eq '{principal_agent_name}'",
-)[0]
-
-principal_agent_id = data["botid"]
-
-# Extract specification of the principal agent as well as
-# it attached sub-agents.
-entity = client.entity(logical_name="botcomponent")
-
-# Read data of the principal agent and its child agents.
-data = entity.read(
-    select=["name", "description", "schemaname", "data"],
-    filter=f"((_parentbotid_value eq '{principal_agent_id}') and startswith(data, 'kind: AgentDialog')) or (name eq '{principal_agent_name}')",  # noqa
-)
-
-for item_index, item in enumerate(data):
-    print(f"\n------------------- Bot Component {item_index} --------------------")
-    print(f"\nName: {item['name']}")
-    print(f"\nSchema Name: {item['schemaname']}")
-    print(f"\nDescription: {item['description']}")
-    print(f"\nSpecification: {item['data'][:1500]}\n...")
-
-
-# --------------------------------------------
-# Example 2: Read conversation logs/activities
-# --------------------------------------------
-
-# Instantiate interface to the entity
 # https://learn.microsoft.com/en-us/power-apps/developer/data-platform/webapi/reference/conversationtranscript
-entity = client.entity(logical_name="conversationtranscript")
-
-# Read data from the entity
-data = entity.read(
-    select=[
-        "name",
-        "_bot_conversationtranscriptid_value",
-        "conversationtranscriptid",
-        "content",
-        "conversationstarttime",
-        "createdon",
-        "metadata",
-    ],
-    filter=f"contains(name, '{os.getenv("CONVERSATION_ID")}')",
-)
-
-
-print("\n\n------------------------- Conversation Logs -------------------------")
-for item in data:
-    item["metadata"] = json.loads(item["metadata"])
-    print(f"\nBot : {item['metadata']['BotName']}")
-    print(f"\nBot ID: {item['_bot_conversationtranscriptid_value']}")
-    # Name of conversation is prefixed with Conversation ID
-    print(f"\nName of Conversation: {item['name']}")
-    print(f"\nTranscript ID: {item['conversationtranscriptid']}")
-    print(f"\nConversation Start Time: {item['conversationstarttime']}")
-    print(f"\nRecord created On: {item['createdon']}")
-    # Content field contains conversation logs/activities
-    content = json.loads(item["content"])
-    print(f"\nConversation Log: {json.dumps(content, indent=2)[:1500]}\n...")
-
-# Close the client session
-session.close()
+
+
+def bot_component_query() -> str:
+    """Query of the bot component (e.g. agent) given by BOT_COMPONENT_ID."""
+    return query_url(
+        "botcomponents",
+        select=["name", "description", "data"],
+        filter=f"botcomponentid eq '{os.getenv("BOT_COMPONENT_ID")}'",
+        top=1,
+    )
+
+
+def principal_agent_query() -> str:
+    """Query of the principal agent given by PRINCIPAL_AGENT_NAME."""
+    return query_url(
+        "bots",
+        select=["name", "botid"],
+        filter=f"name eq '{os.getenv("PRINCIPAL_AGENT_NAME")}'",
+        top=1,
+    )
+
+
+def conversation_query() -> str:
+    """Query of the transcripts of the conversation given by CONVERSATION_ID."""
+    return query_url(
+        "conversationtranscripts",
+        select=[
+            "name",
+            "_bot_conversationtranscriptid_value",
+            "conversationtranscriptid",
+            "content",
+            "conversationstarttime",
+            "createdon",
+            "metadata",
+        ],
+        filter=f"contains(name, '{os.getenv("CONVERSATION_ID")}')",
+        top=TRANSCRIPT_LIMIT,
+    )
+
+
+def example_1a(data: list):
+    """
+    Example 1a: Print bot component (e.g. agent) description and specification.
+
+    Args:
+        data (list): Records returned by bot_component_query.
+    """
+    data = data[0]
+
+    print("\n------------------------- Bot Component -------------------------")
+    print(f"\nName: {data['name']}")
+    print(f"\nDescription: {data['description']}")
+    print(f"\nSpecification: {data['data'][:1500]}\n...")
+
+
+def example_1b(data: list, session: Session, environment_url: str):
+    """
+    Example 1b: Read and print descriptions and specifications of a principal
+    agent and its sub-agents.
+
+    Args:
+        data (list): Records returned by principal_agent_query.
+        session (Session): Authenticated session to the Dataverse environment.
+        environment_url (str): URL of the Dataverse environment.
+    """
+    # Read principal agent id
+    principal_agent_name = data[0]["name"]
+    principal_agent_id = data[0]["botid"]
+
+    # Extract specification of the principal agent as well as
+    # it attached sub-agents.
+    # Read data of the principal agent and its child agents, this query depends
+    # on the principal agent id so it runs after the batch.
+    data = dataverse_get(
+        session,
+        environment_url,
+        query_url(
+            "botcomponents",
+            select=["name", "description", "schemaname", "data"],
+            filter=f"((_parentbotid_value eq '{principal_agent_id}') and startswith(data, 'kind: AgentDialog')) or (name eq '{principal_agent_name}')",  # noqa
+        ),
+    )
+
+    for item_index, item in enumerate(data):
+        print(f"\n------------------- Bot Component {item_index} --------------------")
+        print(f"\nName: {item['name']}")
+        print(f"\nSchema Name: {item['schemaname']}")
+        print(f"\nDescription: {item['description']}")
+        print(f"\nSpecification: {item['data'][:1500]}\n...")
+
+
+def example_2(data: list):
+    """
+    Example 2: Print conversation logs/activities.
+
+    Args:
+        data (list): Records returned by conversation_query.
+    """
+    print("\n\n------------------------- Conversation Logs -------------------------")
+    for item in data:
+        item["metadata"] = orjson.loads(item["metadata"])
+        print(f"\nBot : {item['metadata']['BotName']}")
+        print(f"\nBot ID: {item['_bot_conversationtranscriptid_value']}")
+        # Name of conversation is prefixed with Conversation ID
+        print(f"\nName of Conversation: {item['name']}")
+        print(f"\nTranscript ID: {item['conversationtranscriptid']}")
+        print(f"\nConversation Start Time: {item['conversationstarttime']}")
+        print(f"\nRecord created On: {item['createdon']}")
+        # Content field contains conversation logs/activities
+        content = orjson.loads(item["content"])
+        content = orjson.dumps(content, option=orjson.OPT_INDENT_2).decode()
+        print(f"\nConversation Log: {content[:1500]}\n...")
+
+
+# Examples run by each --example choice, and the query each example reads first.
+EXAMPLES = {
+    "1": ("1a", "1b"),
+    "1a": ("1a",),
+    "1b": ("1b",),
+    "2": ("2",),
+    "all": ("1a", "1b", "2"),
+}
+EXAMPLE_QUERIES = {
+    "1a": bot_component_query,
+    "1b": principal_agent_query,
+    "2": conversation_query,
+}
+
+
+def main():
+    """
+    Example usage:
+        python query_dataverse.py --example all
+
+    The connection to the Dataverse environment and the ids of the records to
+    read are taken from the environment variables (see .env).
+    """
+    parser = argparse.ArgumentParser(description="Query Copilot Studio Dataverse.")
+    parser.add_argument(
+        "--example",
+        choices=EXAMPLES,
+        default="all",
+        help="Example to run: 1 (1a and 1b), 1a, 1b, 2 or all (default).",
+    )
+    args = parser.parse_args()
+
+    examples = EXAMPLES[args.example]
+    environment_url = os.getenv("ENVIRONMENT_URL")
+    session = get_session()
+
+    # The queries of the examples do not depend on each other, so they are run
+    # in a single batch.
+    results = dict(
+        zip(
+            examples,
+            dataverse_batch(
+                session,
+                environment_url,
+                [EXAMPLE_QUERIES[example]() for example in examples],
+            ),
+        )
+    )
+
+    if "1a" in results:
+        example_1a(results["1a"])
+    if "1b" in results:
+        example_1b(results["1b"], session, environment_url)
+    if "2" in results:
+        example_2(results["2"])
+
+    # Close the client session
+    session.close()
+
+
+if __name__ == "__main__":
+    main()